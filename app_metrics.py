@@ -0,0 +1,281 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+#callback instrumentation: per-phase timers (filter, build, serialize), response sizes, row counts and
+#figure cache ratios, aggregated into histograms and served at /metrics in the Prometheus text format.
+#Every gunicorn worker collects its own numbers; with METRICS_DIR set they are merged across workers,
+#the way prometheus_client's multiprocess mode does it: each worker writes a snapshot file every
+#flush_seconds and /metrics sums the histograms and counters of all of them and lists the gauges per
+#worker. Without it every series carries a worker label, so scrapes of different workers stay apart
+
+latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+byte_buckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+row_buckets = (0, 10, 100, 1000, 10000, 100000, 1000000)
+
+slow_log = logging.getLogger('dashboard.slow_requests')
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {} #label tuple -> [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self, label_names, series_by_labels):
+        lines = ['# HELP {} {}'.format(self.name, self.help_text), '# TYPE {} histogram'.format(self.name)]
+        for labels, series in sorted(series_by_labels.items()):
+            base = _labels(label_names, labels)
+            for bound, count in zip(self.buckets, series):
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(self.name, base, bound, count))
+            lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(self.name, base, series[-1]))
+            lines.append('{}_sum{{{}}} {}'.format(self.name, base, series[-2]))
+            lines.append('{}_count{{{}}} {}'.format(self.name, base, series[-1]))
+        return lines
+
+
+def _labels(names, values):
+    return ','.join('{}="{}"'.format(name, value) for name, value in zip(names, values))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Metrics:
+
+    def __init__(self, slow_threshold=None, directory=None, flush_seconds=1.0):
+        #slow_threshold in seconds; callbacks slower than this are logged with their inputs.
+        #directory is where the workers share their snapshots (METRICS_DIR), None for per-worker series
+        self.slow_threshold = slow_threshold
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._flush_pid = None
+        self.phases = Histogram('dashboard_callback_phase_seconds', 'Time spent per callback phase.', latency_buckets)
+        self.callbacks = Histogram('dashboard_callback_seconds', 'Total time spent inside a callback.', latency_buckets)
+        self.requests = Histogram('dashboard_request_seconds', 'Wall time of a callback HTTP request, serialization included.', latency_buckets)
+        self.response_bytes = Histogram('dashboard_response_bytes', 'Size of callback responses.', byte_buckets)
+        self.rows = Histogram('dashboard_rows', 'Rows matched by the filter state of a callback.', row_buckets)
+        #(histogram, label names) in the order they are rendered
+        self.histograms = [
+            (self.callbacks, ['callback']),
+            (self.phases, ['callback', 'phase']),
+            (self.requests, ['output']),
+            (self.response_bytes, ['output']),
+            (self.rows, ['callback']),
+        ]
+        #callables returning [(name, help, value)] evaluated at scrape time; names ending in _total are
+        #monotonic counters (summed across workers), everything else is a per-worker gauge
+        self.gauges = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def phase(self, name):
+        #times a phase of the callback running on this thread; a no-op outside instrumented callbacks
+        current = getattr(self._local, 'current', None)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if current is not None:
+                current['phases'][name] = current['phases'].get(name, 0.0) + time.perf_counter() - start
+
+    def record_rows(self, count):
+        current = getattr(self._local, 'current', None)
+        if current is not None:
+            current['rows'] = count
+
+    def instrumented(self, callback_name):
+        #decorator for Dash callbacks; place it below @app.callback
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                self._local.current = current = {'phases': {}, 'rows': None}
+                start = time.perf_counter()
+                try:
+                    return func(*args)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    self._local.current = None
+                    self._finish(callback_name, elapsed, current, args)
+            return wrapper
+        return decorator
+
+    def _finish(self, callback_name, elapsed, current, args):
+        with self._lock:
+            self.callbacks.observe((callback_name,), elapsed)
+            for phase, seconds in current['phases'].items():
+                self.phases.observe((callback_name, phase), seconds)
+            if current['rows'] is not None:
+                self.rows.observe((callback_name,), current['rows'])
+        if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+            slow_log.warning(json.dumps({
+                'callback': callback_name,
+                'seconds': round(elapsed, 4),
+                'phases': {phase: round(seconds, 4) for phase, seconds in current['phases'].items()},
+                'rows': current['rows'],
+                'inputs': args,
+            }, default=str))
+
+    def init_app(self, server):
+        #request timing and response sizes for Dash callback requests, plus the /metrics endpoint
+        @server.before_request
+        def start_timer():
+            self.ensure_flushing()
+            g.metrics_start = time.perf_counter()
+
+        @server.after_request
+        def record_response(response):
+            if request.path.endswith('/_dash-update-component') and 'metrics_start' in g:
+                body = request.get_json(silent=True) or {}
+                output = str(body.get('output', 'unknown'))
+                with self._lock:
+                    self.requests.observe((output,), time.perf_counter() - g.metrics_start)
+                    if response.content_length is not None:
+                        self.response_bytes.observe((output,), response.content_length)
+            return response
+
+        @server.route('/metrics')
+        def metrics():
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def snapshot(self):
+        #this worker's numbers in a JSON-friendly form: histogram series and the gauge callables' values
+        with self._lock:
+            histograms = {histogram.name: [[list(labels), list(series)] for labels, series in histogram.series.items()]
+                          for histogram, _ in self.histograms}
+        values = [[name, help_text, value] for gauge in self.gauges for name, help_text, value in gauge()]
+        return {'pid': os.getpid(), 'histograms': histograms, 'values': values}
+
+    def _snapshot_path(self, pid):
+        #files are named after the server (the gunicorn master) too, so a restart starts from zero
+        return os.path.join(self.directory, '{}-{}.json'.format(os.getppid(), pid))
+
+    def flush(self):
+        path = self._snapshot_path(os.getpid())
+        tmp = '{}.tmp'.format(path)
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f, default=float)
+        os.replace(tmp, path)
+
+    def ensure_flushing(self):
+        #starts the snapshot writer in this worker; like DatasetManager.ensure_watching it is called per
+        #request, since threads do not survive gunicorn's fork
+        if self.directory is None or self._flush_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flush_pid == os.getpid():
+                return
+            self._flush_pid = os.getpid()
+            os.makedirs(self.directory, exist_ok=True)
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def _snapshots(self):
+        if self.directory is None:
+            return [self.snapshot()]
+        self.flush()
+        prefix = '{}-'.format(os.getppid())
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(prefix) and entry.name.endswith('.json'):
+                try:
+                    with open(entry.path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+    def render(self):
+        snapshots = self._snapshots()
+        #without a shared directory the numbers are this worker's alone, so every series says whose
+        per_worker = self.directory is None
+        lines = []
+        for histogram, label_names in self.histograms:
+            merged = {}
+            for snapshot in snapshots:
+                for labels, series in snapshot['histograms'].get(histogram.name, []):
+                    labels = tuple(labels) + ((snapshot['pid'],) if per_worker else ())
+                    total = merged.setdefault(labels, [0] * len(series))
+                    for i, value in enumerate(series):
+                        total[i] += value
+            lines += histogram.render(label_names + (['worker'] if per_worker else []), merged)
+        #values keep their first-seen order; counters are summed, gauges of exited workers are dropped
+        helps, counters, gauges = {}, {}, {}
+        for snapshot in snapshots:
+            live = snapshot['pid'] == os.getpid() or _alive(snapshot['pid'])
+            for name, help_text, value in snapshot['values']:
+                helps.setdefault(name, help_text)
+                if name.endswith('_total'):
+                    key = snapshot['pid'] if per_worker else None
+                    counters.setdefault(name, {})
+                    counters[name][key] = counters[name].get(key, 0) + value
+                elif live:
+                    gauges.setdefault(name, {})[snapshot['pid']] = value
+        for name, help_text in helps.items():
+            kind = 'counter' if name in counters else 'gauge'
+            lines += ['# HELP {} {}'.format(name, help_text), '# TYPE {} {}'.format(name, kind)]
+            for worker, value in sorted((counters if kind == 'counter' else gauges).get(name, {}).items(), key=lambda item: str(item[0])):
+                labels = '' if worker is None else '{{worker="{}"}}'.format(worker)
+                lines.append('{}{} {}'.format(name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+def figure_cache_gauges(cache):
+    def gauges():
+        stats = cache.stats()
+        return [
+            ('dashboard_figure_cache_hits_total', 'Figure cache hits in a worker\'s memory.', stats['hits']),
+            ('dashboard_figure_cache_shared_hits_total', 'Figure cache hits served by the shared backend.', stats['shared_hits']),
+            ('dashboard_figure_cache_misses_total', 'Figure cache misses.', stats['misses']),
+            ('dashboard_figure_cache_hit_ratio', 'Share of figure lookups answered from a cache.', stats['hit_ratio']),
+            ('dashboard_figure_cache_bytes', 'Bytes held by the in-process figure cache.', stats['bytes']),
+        ]
+    return gauges
+
+
+def metrics_from_env(environ=os.environ):
+    #SLOW_CALLBACK_MS turns on the slow request log; SLOW_CALLBACK_LOG sends it to a file (JSON lines);
+    #METRICS_DIR merges the workers' numbers through snapshot files in that directory
+    threshold = environ.get('SLOW_CALLBACK_MS')
+    if environ.get('SLOW_CALLBACK_LOG'):
+        handler = logging.FileHandler(environ['SLOW_CALLBACK_LOG'])
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        slow_log.addHandler(handler)
+    return Metrics(slow_threshold=float(threshold) / 1000 if threshold else None, directory=environ.get('METRICS_DIR'))
+
+
+#shared instance, so modules like figure_cache can time their phase without being handed it
+metrics = metrics_from_env()
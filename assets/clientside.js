@@ -0,0 +1,180 @@
+//client-side filtering mode (CLIENTSIDE_FILTERING=1): the scatter plot and the pie chart are computed
+//in the browser from the compact dataset, so slider drags never reach the server. The menu-data-store
+//only holds its version and url; the payload is fetched asynchronously once per version (and kept by
+//the HTTP cache), and the menu-data-ready store takes the version once it is decoded, which is what
+//fires the scatter and pie callbacks.
+//the filter semantics match the server: restaurant selection, inclusive slider ranges and a literal,
+//case-insensitive substring search on the item name
+(function () {
+    var decoded = null;
+
+    function typedArray(b64, Type) {
+        var binary = window.atob(b64);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new Type(bytes.buffer);
+    }
+
+    var loading = null;
+
+    function decodePayload(version, payload) {
+        return {
+            version: version,
+            rows: payload.rows,
+            restaurants: payload.restaurants,
+            restaurant: typedArray(payload.restaurant, Uint16Array),
+            names: payload.names,
+            lowerNames: payload.names.map(function (name) { return name.toLowerCase(); }),
+            name: typedArray(payload.name, Int32Array),
+            protein: typedArray(payload.protein, Float32Array),
+            carbohydrates: typedArray(payload.carbohydrates, Float32Array),
+            total_fat: typedArray(payload.total_fat, Float32Array),
+            calories: typedArray(payload.calories, Float32Array)
+        };
+    }
+
+    function startLoading(store) {
+        //one fetch per version; the page keeps working while it runs
+        if (loading && loading.version === store.version) {
+            return loading;
+        }
+        var state = loading = {version: store.version, failed: false};
+        fetch(store.url).then(function (response) {
+            if (!response.ok) {
+                throw new Error('menu data ' + response.status);
+            }
+            return response.json();
+        }).then(function (payload) {
+            decoded = decodePayload(store.version, payload);
+        }).catch(function () {
+            state.failed = true;
+        });
+        return state;
+    }
+
+    function filterRows(data, restaurants, search, ranges) {
+        var selected = new Uint8Array(data.restaurants.length);
+        var lookup = {};
+        data.restaurants.forEach(function (name, code) { lookup[name] = code; });
+        (restaurants || []).forEach(function (name) {
+            if (name in lookup) {
+                selected[lookup[name]] = 1;
+            }
+        });
+        //the search is checked once per distinct name, not once per row
+        var nameMatches = null;
+        if (search) {
+            var term = search.toLowerCase();
+            nameMatches = new Uint8Array(data.names.length);
+            data.lowerNames.forEach(function (name, code) {
+                nameMatches[code] = name.indexOf(term) !== -1 ? 1 : 0;
+            });
+        }
+        var active = ranges.filter(function (range) { return range[1]; }).map(function (range) {
+            return [data[range[0]], Math.fround(range[1][0]), Math.fround(range[1][1])];
+        });
+        var rows = [];
+        for (var i = 0; i < data.rows; i++) {
+            if (!selected[data.restaurant[i]]) {
+                continue;
+            }
+            var keep = true;
+            for (var j = 0; j < active.length && keep; j++) {
+                var value = active[j][0][i];
+                keep = value >= active[j][1] && value <= active[j][2];
+            }
+            if (keep && nameMatches && !(data.name[i] >= 0 && nameMatches[data.name[i]])) {
+                keep = false;
+            }
+            if (keep) {
+                rows.push(i);
+            }
+        }
+        return rows;
+    }
+
+    function rowsFor(ready, restaurants, search, protein, carbs, fats, calories) {
+        var data = decoded;
+        if (!ready || !data || data.version !== ready) {
+            return null;
+        }
+        var ranges = [['protein', protein], ['carbohydrates', carbs], ['total_fat', fats], ['calories', calories]];
+        return {data: data, rows: filterRows(data, restaurants, search, ranges)};
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        menu: {
+            //always registered (not only in client-side mode): bumps this session's filter-seq on every
+            //filter change, so the server can drop callbacks for states the user has already moved past
+            bump_sequence: function () {
+                var current = arguments[arguments.length - 1] || {};
+                return {session: current.session, seq: (current.seq || 0) + 1};
+            },
+            //polled by the menu-data-poll interval until the payload is decoded: returns the decoded
+            //version for menu-data-ready and whether to stop polling
+            ready: function (store, nIntervals) {
+                if (!store) {
+                    return [window.dash_clientside.no_update, true];
+                }
+                if (decoded && decoded.version === store.version) {
+                    return [store.version, true];
+                }
+                var state = startLoading(store);
+                return [window.dash_clientside.no_update, state.failed];
+            },
+            scatter: function (restaurants, search, protein, carbs, fats, calories, ready) {
+                var result = rowsFor(ready, restaurants, search, protein, carbs, fats, calories);
+                if (!result) {
+                    return window.dash_clientside.no_update;
+                }
+                var data = result.data;
+                var x = [], y = [], color = [], text = [];
+                result.rows.forEach(function (i) {
+                    x.push(data.protein[i]);
+                    y.push(data.carbohydrates[i]);
+                    color.push(data.calories[i]);
+                    text.push(data.name[i] >= 0 ? data.names[data.name[i]] : '');
+                });
+                return {
+                    data: [{
+                        type: 'scattergl', mode: 'markers', x: x, y: y, text: text,
+                        marker: {color: color, colorscale: 'Plasma', showscale: true, colorbar: {title: {text: 'calories'}}},
+                        hovertemplate: '%{text}<br>protein=%{x:.1f}<br>carbohydrates=%{y:.1f}<br>calories=%{marker.color:.0f}<extra></extra>'
+                    }],
+                    layout: {
+                        title: {text: 'Protein vs. Carbohydrates'},
+                        xaxis: {title: {text: 'Protein (g)'}},
+                        yaxis: {title: {text: 'Carbs (g)'}},
+                        uirevision: 'scatter'
+                    }
+                };
+            },
+            pie: function (restaurants, search, protein, carbs, fats, calories, ready, store) {
+                var result = rowsFor(ready, restaurants, search, protein, carbs, fats, calories);
+                if (!result) {
+                    return window.dash_clientside.no_update;
+                }
+                var data = result.data;
+                var sums = [0, 0, 0];
+                result.rows.forEach(function (i) {
+                    sums[0] += data.protein[i];
+                    sums[1] += data.carbohydrates[i];
+                    sums[2] += data.total_fat[i];
+                });
+                var count = result.rows.length;
+                var means = sums.map(function (sum) { return count ? sum / count : null; });
+                var standard = store.standard;
+                return {
+                    data: [{
+                        type: 'pie', hole: 0.3, textposition: 'outside', textinfo: 'percent+label',
+                        labels: ['Protein', 'Carbohydrates', 'Total Fat', 'Standard Protein', 'Standard Carbs', 'Standard Fat'],
+                        values: means.concat([standard.protein, standard.carbs, standard.fat])
+                    }],
+                    layout: {title: {text: 'Marco Composition for Selected Restaurants'}, hovermode: 'closest'}
+                };
+            }
+        }
+    });
+})();
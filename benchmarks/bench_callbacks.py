@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+#headless benchmark of the dashboard callbacks: replays interaction traces (slider drags, restaurant
+#multi-selects, incremental search typing) against data.csv and synthetic datasets drawn from its
+#distribution, and reports p50/p95 latency, response bytes and peak RSS per callback and scale.
+#
+#    python benchmarks/bench_callbacks.py --scales 1 10 100 --output bench.json [--baseline old.json]
+#
+#every scale runs in its own interpreter, since project_app loads its dataset at import time
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+default_work_dir = os.path.join(repo_root, 'benchmarks', 'data')
+#only the columns the dashboard loads are written to the synthetic files
+synthetic_columns = ['menu_item_id', 'food_category', 'restaurant', 'item_name', 'calories', 'total_fat', 'carbohydrates', 'protein']
+nutrient_columns = ['calories', 'total_fat', 'carbohydrates', 'protein']
+chunk_rows = 500000
+
+
+def synthetic_csv(scale, work_dir, seed=0):
+    #scale x data.csv rows, resampled with replacement; nutrients get +-15% multiplicative noise rounded
+    #to one decimal like the source, so the per-restaurant mix and value distributions are preserved
+    if scale == 1:
+        return os.path.join(repo_root, 'data.csv')
+    path = os.path.join(work_dir, 'menu_x{}.csv'.format(scale))
+    if os.path.exists(path):
+        return path
+    os.makedirs(work_dir, exist_ok=True)
+    source = pd.read_csv(os.path.join(repo_root, 'data.csv'), usecols=synthetic_columns)[synthetic_columns]
+    rng = np.random.default_rng(seed)
+    total = len(source) * scale
+    tmp = path + '.tmp'
+    written = 0
+    with open(tmp, 'w', newline='') as f:
+        while written < total:
+            size = min(chunk_rows, total - written)
+            chunk = source.iloc[rng.integers(0, len(source), size)].reset_index(drop=True)
+            for column in nutrient_columns:
+                noise = rng.uniform(0.85, 1.15, size)
+                chunk[column] = np.round(chunk[column].to_numpy() * noise, 1)
+            chunk['menu_item_id'] = np.arange(written, written + size)
+            chunk.to_csv(f, header=written == 0, index=False)
+            written += size
+    os.replace(tmp, path)
+    return path
+
+
+def traces(df):
+    #interaction traces as lists of the six filter inputs, in the order a browser would send them
+    full = {column: [float(df[column].min()), float(df[column].max())] for column in nutrient_columns}
+    popular = list(df['restaurant'].value_counts().index[:10])
+    base = dict(restaurants=popular[:3], protein=full['protein'], carbs=full['carbohydrates'],
+                fats=full['total_fat'], calories=full['calories'], search=None)
+    runs = {}
+
+    steps = []
+    for high in np.linspace(full['protein'][1], full['protein'][0] + 5, 20):
+        steps.append(dict(base, protein=[full['protein'][0], float(round(high))]))
+    for high in np.linspace(full['calories'][1], 300, 20):
+        steps.append(dict(base, calories=[full['calories'][0], float(round(high))]))
+    #dragging back over the same values, which the caches should absorb
+    steps += steps[::-1]
+    runs['slider_drag'] = steps
+
+    runs['restaurant_multiselect'] = [dict(base, restaurants=popular[:n]) for n in range(1, len(popular) + 1)]
+
+    steps = []
+    for term in ['chicken', 'burger', 'salad']:
+        for n in range(1, len(term) + 1):
+            steps.append(dict(base, restaurants=popular, search=term[:n]))
+    runs['search_typing'] = steps
+    return runs
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def run_scale(csv_path, use_cache):
+    #runs inside the per-scale interpreter: import the app, replay the traces, print a JSON summary
+    from plotly.io.json import to_json_plotly
+
+    if not use_cache:
+        os.environ['FIGURE_CACHE_MB'] = '0'
+    os.environ['MENU_DATA_CSV'] = csv_path
+    os.environ['DATASET_POLL_SECONDS'] = '0'
+    os.environ['WARMUP'] = '0'
+    os.environ.setdefault('MENU_SNAPSHOT_ROOT', os.path.join(default_work_dir, 'snapshot'))
+    sys.path.insert(0, repo_root)
+    os.chdir(repo_root)
+    start = time.perf_counter()
+    import project_app
+    startup = time.perf_counter() - start
+
+    callbacks = {
+        'menu_items': getattr(project_app.update_menu_items, '__wrapped__', project_app.update_menu_items),
+        'scatter': getattr(project_app.update_scatter_plot, '__wrapped__', project_app.update_scatter_plot),
+        'pie': getattr(project_app.update_pie_chart, '__wrapped__', project_app.update_pie_chart),
+    }
+    calls = {
+        'menu_items': lambda s: callbacks['menu_items'](s['restaurants'], s['protein'], s['carbs'], s['fats'], s['calories'], s['search'], 0, [], '', None),
+        'scatter': lambda s: callbacks['scatter'](s['restaurants'], s['search'], s['protein'], s['carbs'], s['fats'], s['calories'], None, None),
+        'pie': lambda s: callbacks['pie'](s['restaurants'], s['search'], s['protein'], s['carbs'], s['fats'], s['calories'], None),
+    }
+    results = {}
+    for trace, steps in traces(project_app.dataset_manager.current.df).items():
+        for name, call in calls.items():
+            latencies, sizes = [], []
+            for state in steps:
+                tick = time.perf_counter()
+                response = call(state)
+                latencies.append(time.perf_counter() - tick)
+                sizes.append(len(to_json_plotly(response)))
+            results['{}/{}'.format(trace, name)] = {
+                'calls': len(steps),
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'mean_ms': float(np.mean(latencies)) * 1000,
+                'bytes_p50': percentile(sizes, 50),
+                'bytes_max': max(sizes),
+            }
+    #ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+    return {'rows': len(project_app.dataset_manager.current.df), 'startup_s': startup, 'peak_rss_mb': peak_rss_mb, 'callbacks': results}
+
+
+def compare(results, baseline):
+    lines = []
+    for scale, run in results['scales'].items():
+        old_run = baseline.get('scales', {}).get(scale)
+        if old_run is None:
+            continue
+        for key, stats in run['callbacks'].items():
+            old = old_run['callbacks'].get(key)
+            if old:
+                lines.append('x{:<5} {:<40} p95 {:8.2f} ms -> {:8.2f} ms ({:+.0%})'.format(
+                    scale, key, old['p95_ms'], stats['p95_ms'], stats['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard callbacks at scaled data sizes.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--baseline', help='earlier --output file to compare p95 latencies against')
+    parser.add_argument('--work-dir', default=default_work_dir, help='where synthetic csvs and their snapshots go')
+    parser.add_argument('--cache', action='store_true', help='keep the figure cache on (off by default to time the work itself)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_scale(args.worker, args.cache)))
+        return
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'figure_cache': args.cache,
+        'scales': {},
+    }
+    for scale in args.scales:
+        csv_path = synthetic_csv(scale, args.work_dir)
+        command = [sys.executable, os.path.abspath(__file__), '--worker', csv_path] + (['--cache'] if args.cache else [])
+        env = dict(os.environ, MENU_SNAPSHOT_ROOT=os.path.join(args.work_dir, 'snapshot'))
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        results['scales'][str(scale)] = run
+        print('x{}: {:,} rows, startup {:.2f} s, peak RSS {:.0f} MB'.format(scale, run['rows'], run['startup_s'], run['peak_rss_mb']))
+        for key, stats in run['callbacks'].items():
+            print('    {:<40} p50 {:8.2f} ms  p95 {:8.2f} ms  {:>10,.0f} B'.format(key, stats['p50_ms'], stats['p95_ms'], stats['bytes_p50']))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            for line in compare(results, json.load(f)):
+                print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import math
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+#streaming version of data/data_cleaning.ipynb: reads the raw MenuStat export in chunks, so memory
+#depends on the chunk size and the number of distinct nutrient values instead of the file size.
+#
+#    python clean_data.py foodnutrient.csv --output data.csv [--check data.csv]
+#
+#pass 1 coerces the numeric columns, drops the unused columns and the rows without a restaurant, and
+#sketches every nutrient column for the IQR outlier bounds; pass 2 drops the outliers into a temporary
+#file while collecting the imputation means and medians; pass 3 imputes, drops duplicate rows by hash
+#and writes the cleaned csv that project_app.py loads
+
+numerical_columns = ['calories', 'total_fat', 'saturated_fat', 'trans_fat', 'cholesterol', 'sodium', 'carbohydrates', 'dietary_fiber', 'sugar', 'protein']
+#same column positions the notebook drops: duplicated columns and the sparse serving_size ones
+indices_to_drop = [0, 1, 7, 8, 9, 10, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32]
+#calories and sodium are skewed, so they are imputed with the median; the others with the mean
+median_columns = ['calories', 'sodium']
+threshold = 1.5
+default_chunk_rows = 200000
+
+
+class ValueCountSketch:
+    #quantile sketch over the distinct values of a column. It is exact (same result as pandas' linear
+    #quantile) while there are at most max_distinct values; past that the values are rounded to one
+    #decimal less at a time (starting at decimals - 1), keeping memory bounded and the quantiles approximate
+
+    def __init__(self, max_distinct=200000, decimals=7):
+        self.max_distinct = max_distinct
+        self.decimals = decimals
+        self.counts = pd.Series(dtype=np.int64)
+        self.exact = True
+
+    def update(self, values):
+        counts = values.dropna().value_counts()
+        if not self.exact:
+            counts = counts.groupby(counts.index.to_numpy().round(self.decimals)).sum()
+        self.counts = self.counts.add(counts, fill_value=0).astype(np.int64)
+        while len(self.counts) > self.max_distinct:
+            self.exact = False
+            self.decimals -= 1
+            self.counts = self.counts.groupby(self.counts.index.to_numpy().round(self.decimals)).sum()
+
+    def quantile(self, q):
+        counts = self.counts.sort_index()
+        total = int(counts.sum())
+        if not total:
+            return np.nan
+        values = counts.index.to_numpy(dtype=np.float64)
+        cumulative = counts.to_numpy().cumsum()
+        position = (total - 1) * q
+        low, high = values[np.searchsorted(cumulative, [math.floor(position), math.ceil(position)], side='right')]
+        #numpy's linear interpolation, so exact sketches reproduce df.quantile() to the bit
+        t = position - math.floor(position)
+        if t >= 0.5:
+            return high - (high - low) * (1 - t)
+        return low + (high - low) * t
+
+
+def read_chunks(path, chunk_rows, **kwargs):
+    #every column is read as text, so the kept text columns are written back exactly as they came in
+    return pd.read_csv(path, dtype=str, keep_default_na=True, chunksize=chunk_rows, **kwargs)
+
+
+def prepare(chunk):
+    #the notebook's per-row steps: numeric coercion, column drop, rows without a restaurant
+    for column in numerical_columns:
+        chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+    chunk = chunk.drop(columns=chunk.columns[indices_to_drop])
+    return chunk.dropna(subset=['restaurant'])
+
+
+def outlier_bounds(sketches):
+    bounds = {}
+    for column, sketch in sketches.items():
+        q1, q3 = sketch.quantile(0.25), sketch.quantile(0.75)
+        iqr = q3 - q1
+        bounds[column] = (q1 - threshold * iqr, q3 + threshold * iqr)
+    return bounds
+
+
+def clean(raw_path, output_path, chunk_rows=default_chunk_rows):
+    #pass 1: outlier bounds
+    sketches = {column: ValueCountSketch() for column in numerical_columns}
+    for chunk in read_chunks(raw_path, chunk_rows):
+        chunk = prepare(chunk)
+        for column in numerical_columns:
+            sketches[column].update(chunk[column])
+    bounds = outlier_bounds(sketches)
+
+    #pass 2: drop outliers, collect imputation statistics
+    sums = {column: [] for column in numerical_columns}
+    counts = dict.fromkeys(numerical_columns, 0)
+    medians = {column: ValueCountSketch() for column in median_columns}
+    tmp_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', dir=tmp_dir, delete=False, newline='') as tmp:
+        tmp_path = tmp.name
+        header = True
+        for chunk in read_chunks(raw_path, chunk_rows):
+            chunk = prepare(chunk)
+            outliers = np.zeros(len(chunk), dtype=bool)
+            for column, (low, high) in bounds.items():
+                values = chunk[column].to_numpy()
+                outliers |= (values < low) | (values > high)
+            chunk = chunk[~outliers]
+            for column in numerical_columns:
+                values = chunk[column].dropna().to_numpy()
+                sums[column].append(math.fsum(values))
+                counts[column] += len(values)
+            for column, sketch in medians.items():
+                sketch.update(chunk[column])
+            chunk.to_csv(tmp, header=header, index=False)
+            header = False
+
+    fill_values = {}
+    for column in numerical_columns:
+        if column in medians:
+            fill_values[column] = medians[column].quantile(0.5)
+        else:
+            fill_values[column] = math.fsum(sums[column]) / counts[column] if counts[column] else np.nan
+
+    #pass 3: impute, drop duplicate rows (first one wins) by 64-bit row hash, write the result
+    seen = set()
+    rows_written = 0
+    output_tmp = output_path + '.tmp'
+    try:
+        with open(output_tmp, 'w', newline='') as out:
+            header = True
+            for chunk in read_chunks(tmp_path, chunk_rows):
+                for column in numerical_columns:
+                    chunk[column] = pd.to_numeric(chunk[column]).fillna(fill_values[column])
+                hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+                keep = ~pd.Series(hashes).duplicated().to_numpy()
+                keep &= np.fromiter((h not in seen for h in hashes), dtype=bool, count=len(hashes))
+                seen.update(hashes[keep].tolist())
+                chunk = chunk[keep]
+                chunk.to_csv(out, header=header, index=False)
+                header = False
+                rows_written += len(chunk)
+        os.replace(output_tmp, output_path)
+    finally:
+        os.remove(tmp_path)
+        if os.path.exists(output_tmp):
+            os.remove(output_tmp)
+    return {'rows': rows_written, 'outlier_bounds': bounds, 'fill_values': fill_values,
+            'exact_quantiles': all(sketch.exact for sketch in list(sketches.values()) + list(medians.values()))}
+
+
+def compare_outputs(path, reference_path):
+    #differences between a pipeline output and a reference cleaned csv (e.g. the notebook's data.csv)
+    new, old = pd.read_csv(path), pd.read_csv(reference_path)
+    problems = []
+    if list(new.columns) != list(old.columns):
+        problems.append('columns differ: {} vs {}'.format(list(new.columns), list(old.columns)))
+    elif len(new) != len(old):
+        problems.append('row counts differ: {} vs {}'.format(len(new), len(old)))
+    else:
+        for column in new.columns:
+            if column in numerical_columns:
+                same = np.allclose(new[column], old[column], rtol=1e-12, equal_nan=True)
+            else:
+                same = new[column].fillna('').astype(str).equals(old[column].fillna('').astype(str))
+            if not same:
+                problems.append('values differ in {}'.format(column))
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clean the raw MenuStat export in chunks (same steps as data/data_cleaning.ipynb).')
+    parser.add_argument('raw', nargs='?', default='foodnutrient.csv')
+    parser.add_argument('--output', default='data.csv')
+    parser.add_argument('--chunk-rows', type=int, default=default_chunk_rows)
+    parser.add_argument('--check', metavar='REFERENCE', help='compare the output against an earlier cleaned csv')
+    args = parser.parse_args()
+    summary = clean(args.raw, args.output, args.chunk_rows)
+    print('wrote {:,} rows to {} ({} quantiles)'.format(summary['rows'], args.output, 'exact' if summary['exact_quantiles'] else 'approximate'))
+    if args.check:
+        problems = compare_outputs(args.output, args.check)
+        print('\n'.join(problems) if problems else 'output matches {}'.format(args.check))
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import plotly.io as pio
+
+from app_metrics import metrics
+
+#orjson is optional: plotly uses it for to_json when installed, and it is much faster at loads too
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def figure_json(fig):
+    #compact JSON bytes of a figure; validation already happened when the figure was built
+    return pio.to_json(fig, validate=False, engine='orjson' if orjson else 'json').encode('utf-8')
+
+
+def loads(payload):
+    return orjson.loads(payload) if orjson else json.loads(payload)
+
+
+class DiskBackend:
+    #shared second level for all gunicorn workers on a box: one file per key, written atomically,
+    #expired by modification time and pruned oldest-first once the directory outgrows max_bytes
+
+    def __init__(self, directory, ttl=3600, max_bytes=256 * 2 ** 20):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sets = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if self.ttl and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, payload):
+        path = self._path(key)
+        tmp = '{}.tmp-{}-{}'.format(path, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        self._sets += 1
+        if self._sets % 100 == 0:
+            self.prune()
+
+    def prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes and not (self.ttl and now - mtime > self.ttl):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                os.remove(entry.path)
+
+
+class RedisBackend:
+    #shared level backed by a (local) Redis server; redis-py is only needed when this is used
+
+    def __init__(self, url, ttl=3600, prefix='figure-cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, payload):
+        self.client.set(self.prefix + key, payload, ex=self.ttl or None)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class FigureCache:
+    #serialized figure responses keyed by (figure name, dataset version, normalized filter state).
+    #The first level is a per-process LRU bounded by bytes with a TTL; the optional backend is shared
+
+    def __init__(self, max_bytes=64 * 2 ** 20, ttl=3600, backend=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict() #key -> (stored at, payload)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(name, version, state):
+        #namedtuples and tuples of floats/strings have a stable repr, so it makes a portable key
+        return hashlib.sha1(repr((name, version, state)).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, payload = entry
+                if not self.ttl or time.time() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                self._remove(key)
+        if self.backend is not None:
+            payload = self.backend.get(key)
+            if payload is not None:
+                self._store(key, payload)
+                with self._lock:
+                    self.shared_hits += 1
+                return payload
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, payload):
+        self._store(key, payload)
+        if self.backend is not None:
+            self.backend.set(key, payload)
+
+    def _store(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time(), payload)
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def cached_figure(self, name, version, state, build):
+        #returns the figure as a plain dict; build() only runs on a miss
+        key = self.make_key(name, version, state)
+        payload = self.get(key)
+        if payload is None:
+            fig = build()
+            with metrics.phase('serialize'):
+                payload = figure_json(fig)
+            self.set(key, payload)
+        return loads(payload)
+
+    def clear(self, include_backend=True):
+        #include_backend=False drops only this worker's entries, e.g. after a dataset swap, where the
+        #shared entries of the old version are simply never looked up again and age out by TTL
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if include_backend and self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'backend': type(self.backend).__name__ if self.backend is not None else None,
+            }
+
+
+def cache_from_env(environ=os.environ):
+    #FIGURE_CACHE_MB bounds the in-process level, FIGURE_CACHE_TTL is in seconds;
+    #FIGURE_CACHE_REDIS_URL or FIGURE_CACHE_DIR turn on a level shared by all workers
+    ttl = int(environ.get('FIGURE_CACHE_TTL', 3600))
+    backend = None
+    if environ.get('FIGURE_CACHE_REDIS_URL'):
+        backend = RedisBackend(environ['FIGURE_CACHE_REDIS_URL'], ttl=ttl)
+    elif environ.get('FIGURE_CACHE_DIR'):
+        backend = DiskBackend(environ['FIGURE_CACHE_DIR'], ttl=ttl)
+    return FigureCache(max_bytes=int(environ.get('FIGURE_CACHE_MB', 64)) * 2 ** 20, ttl=ttl, backend=backend)
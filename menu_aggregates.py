@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+#macro columns averaged by the pie chart
+macro_columns = ['protein', 'carbohydrates', 'total_fat']
+
+
+class AggregateCube:
+    #precomputed sums for the macro averages, built once per dataset next to the MenuIndex:
+    # - per-restaurant sums and counts answer a restaurant-only selection (full slider ranges)
+    # - per slider column, rows ordered by (restaurant, value) with prefix sums of the macros answer
+    #   a selection narrowed by a single slider with two binary searches per restaurant
+    #anything else (several narrowed sliders, a search term) falls back to masked_totals()
+
+    def __init__(self, df, index, columns=macro_columns):
+        self.index = index
+        self.columns = columns
+        self.values = np.column_stack([df[column].to_numpy(dtype=np.float64) for column in columns])
+        self.counts = np.diff(index.bounds)
+        self.sums = np.zeros((len(self.counts), len(columns)))
+        if len(df):
+            self.sums = np.add.reduceat(self.values, index.bounds[:-1], axis=0)
+        self.sorted_values = {}
+        self.prefix_sums = {}
+        for column, values in index.values.items():
+            #codes are already non-decreasing, so this orders each restaurant block by the column
+            order = np.lexsort((values, index.codes))
+            prefix = np.zeros((len(df) + 1, len(columns)))
+            np.cumsum(self.values[order], axis=0, out=prefix[1:])
+            self.sorted_values[column] = values[order]
+            self.prefix_sums[column] = prefix
+
+    def totals(self, restaurants, ranges):
+        #(macro sums, row count) of the selection, or None when it cannot be answered from the cube
+        codes = self.index.selected_codes(restaurants)
+        narrowing = []
+        for column, (low, high) in ranges:
+            start, stop = self.index.range_slice(column, low, high)
+            if stop - start != self.index.n_rows:
+                narrowing.append((column, low, high))
+        if not narrowing:
+            return self.sums[codes].sum(axis=0), int(self.counts[codes].sum())
+        if len(narrowing) > 1:
+            return None
+
+        column, low, high = narrowing[0]
+        sorted_values = self.sorted_values[column]
+        prefix = self.prefix_sums[column]
+        low, high = sorted_values.dtype.type(low), sorted_values.dtype.type(high)
+        sums = np.zeros(len(self.columns))
+        count = 0
+        for code in codes:
+            block_start, block_stop = self.index.bounds[code], self.index.bounds[code + 1]
+            block = sorted_values[block_start:block_stop]
+            start = block_start + np.searchsorted(block, low, side='left')
+            stop = block_start + np.searchsorted(block, high, side='right')
+            if stop > start:
+                sums += prefix[stop] - prefix[start]
+                count += stop - start
+        return sums, count
+
+    def masked_totals(self, positions):
+        return self.values[positions].sum(axis=0), len(positions)
+
+    def restaurant_means(self):
+        #average macros of every restaurant's full menu, for restaurant comparisons
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.sums / self.counts[:, None]
+        names = sorted(self.index.restaurant_codes, key=self.index.restaurant_codes.get)
+        return pd.DataFrame(means, index=pd.Index(names, name='restaurant'), columns=self.columns)
+
+
+def means_from_totals(totals):
+    sums, count = totals
+    if not count:
+        return np.full(len(sums), np.nan)
+    return sums / count
+
+
+if __name__ == '__main__':
+    #correctness check: cube answers must match the means of the masked rows
+    from menu_index import MenuIndex, range_columns, sort_by_restaurant
+    rng = np.random.default_rng(0)
+    df = sort_by_restaurant(pd.read_csv('data.csv'))
+    index = MenuIndex(df)
+    cube = AggregateCube(df, index)
+    restaurants = df['restaurant'].unique()
+    for trial in range(300):
+        chosen = list(rng.choice(restaurants, size=rng.integers(1, 20), replace=False))
+        ranges = []
+        if rng.random() < 0.7:
+            column = rng.choice(range_columns)
+            ranges.append((column, tuple(sorted(rng.uniform(df[column].min(), df[column].max(), size=2)))))
+        totals = cube.totals(chosen, ranges)
+        positions = index.query(chosen, ranges)
+        expected = df[macro_columns].iloc[positions].mean().to_numpy()
+        assert np.allclose(means_from_totals(totals), expected, equal_nan=True), (chosen, ranges)
+    print('AggregateCube matches the masked means on 300 random filter states')
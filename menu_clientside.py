@@ -0,0 +1,33 @@
+import base64
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from menu_index import range_columns
+
+#compact columnar copy of the dataset for the client-side filtering mode: typed arrays as base64
+#(little-endian float32 nutrients, uint16 restaurant codes, int32 item name codes) plus the two string
+#dictionaries. assets/clientside.js decodes it once per version and filters it in the browser
+
+
+def _b64(values, dtype):
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+@lru_cache(maxsize=2)
+def encode_dataset(dataset):
+    df = dataset.df
+    restaurant_codes, restaurants = pd.factorize(df['restaurant'])
+    name_codes, names = pd.factorize(df['item_name'])
+    payload = {
+        'version': dataset.version,
+        'rows': len(df),
+        'restaurants': [str(name) for name in restaurants],
+        'restaurant': _b64(restaurant_codes, '<u2'),
+        'names': [str(name) for name in names],
+        'name': _b64(name_codes, '<i4'),
+    }
+    for column in range_columns:
+        payload[column] = _b64(df[column].to_numpy(), '<f4')
+    return payload
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from menu_index import range_columns
+from menu_snapshot import build_snapshot, default_csv, default_snapshot_root, load_column, load_snapshot, read_manifest
+
+#compact in-memory model of the menu dataset. Only the columns the dashboard reads on every request
+#are loaded up front: restaurant as a categorical, item_name with repeated names sharing one string,
+#and the slider nutrients as float32 views of the memory-mapped snapshot. Everything else
+#(item_description, food_category, the other nutrients) is loaded the first time it is asked for.
+#None of the loaded arrays are written after startup, so under gunicorn --preload the workers keep
+#sharing the parent's pages instead of copying them.
+dashboard_columns = range_columns + ['restaurant', 'item_name']
+categorical_columns = ['restaurant', 'food_category']
+
+
+def _is_mapped(values):
+    if isinstance(values, pd.Categorical):
+        values = values.codes
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = getattr(values, 'base', None)
+    return False
+
+
+class MenuData:
+
+    def __init__(self, snapshot_path):
+        self.path = snapshot_path
+        self.manifest = read_manifest(snapshot_path)
+        self.frame = load_snapshot(snapshot_path, dashboard_columns, categorical_columns)
+        self._lazy = {}
+
+    @classmethod
+    def load(cls, csv_path=default_csv, snapshot_root=default_snapshot_root):
+        return cls(build_snapshot(csv_path, snapshot_root))
+
+    def column(self, name):
+        if name in self.frame:
+            return self.frame[name]
+        if name not in self._lazy:
+            values = load_column(self.path, self.manifest, name, name in categorical_columns)
+            self._lazy[name] = pd.Series(values, name=name, copy=False)
+        return self._lazy[name]
+
+    def memory_usage(self):
+        #bytes per loaded column; mapped columns live in the page cache and are shared by all workers.
+        #deep object sizes count a shared string once per row, so text columns are an upper bound
+        rows = []
+        for name, series in list(self.frame.items()) + list(self._lazy.items()):
+            rows.append({
+                'column': name,
+                'dtype': str(series.dtype),
+                'bytes': int(series.memory_usage(index=False, deep=True)),
+                'mapped': _is_mapped(series.array if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy()),
+            })
+        return pd.DataFrame(rows).set_index('column')
+
+
+if __name__ == '__main__':
+    data = MenuData.load()
+    usage = data.memory_usage()
+    print(usage)
+    csv_bytes = pd.read_csv(default_csv).memory_usage(index=False, deep=True).sum()
+    print('compact model: {:,} bytes ({:,} private), csv DataFrame: {:,} bytes'.format(
+        usage['bytes'].sum(), usage.loc[~usage['mapped'], 'bytes'].sum(), csv_bytes))
@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+import time
+
+from menu_aggregates import AggregateCube
+from menu_data import MenuData
+from menu_index import MenuIndex, range_columns, sort_by_restaurant
+from menu_search import SearchIndex
+from menu_snapshot import cached_file_hash, lease_snapshots, prune_snapshots
+
+log = logging.getLogger('dashboard.dataset')
+
+
+class Dataset:
+    #one loaded version of the menu data with everything derived from it. Callbacks take the current
+    #Dataset once and use only it, so a reload never changes the data under a request in flight
+
+    def __init__(self, menu_data):
+        self.data = menu_data
+        self.version = menu_data.manifest['csv_sha256'][:16]
+        #kept grouped by restaurant so the query index can partition it
+        self.df = sort_by_restaurant(menu_data.frame)
+        self.index = MenuIndex(self.df)
+        self.search = SearchIndex(self.df['item_name'])
+        self.cube = AggregateCube(self.df, self.index)
+        #slider limits and dropdown options handed to new sessions
+        self.slider_bounds = {column: (float(self.df[column].min()), float(self.df[column].max())) for column in range_columns}
+        self.restaurants = list(self.df['restaurant'].unique())
+
+
+class DatasetManager:
+    #holds the current Dataset and swaps in a new one when the csv changes: a background thread polls
+    #the file's mtime/size, hashes it when they move, builds the new snapshot, indexes and aggregates
+    #off the request path, then replaces the reference in one assignment and calls the on_swap hooks.
+    #Every serving process leases the snapshots it uses (the current one, and the outgoing one after a
+    #swap, for requests still running on it); a swap deletes the snapshots nobody leases any more
+
+    def __init__(self, csv_path, snapshot_root, poll_seconds=30):
+        self.csv_path = csv_path
+        self.snapshot_root = snapshot_root
+        self.poll_seconds = poll_seconds
+        self.on_swap = [] #callables taking (old dataset, new dataset)
+        self.reloads = 0
+        self._stat = self._file_stat()
+        self.current = Dataset(MenuData.load(csv_path, snapshot_root))
+        self._lock = threading.Lock()
+        self._watch_pid = None
+
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.csv_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def ensure_watching(self):
+        #leases the current snapshot and starts the watcher in this process; threads do not survive
+        #gunicorn's fork, so this is called per request instead of at import (cheap once it has run)
+        if self._watch_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watch_pid == os.getpid():
+                return
+            self._watch_pid = os.getpid()
+            self._lease(self.current)
+            if self.poll_seconds:
+                threading.Thread(target=self._watch, name='dataset-watcher', daemon=True).start()
+
+    def _lease(self, *datasets):
+        try:
+            lease_snapshots(self.snapshot_root, [dataset.data.path for dataset in datasets])
+        except OSError:
+            log.exception('leasing snapshots under %s failed', self.snapshot_root)
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self.reload_if_changed()
+            except Exception:
+                log.exception('reloading %s failed; still serving version %s', self.csv_path, self.current.version)
+
+    def reload_if_changed(self):
+        stat = self._file_stat()
+        if stat is None or stat == self._stat:
+            return False
+        #a changed mtime alone (touch, copy of the same file) keeps the current version
+        if cached_file_hash(self.csv_path, self.snapshot_root)[:16] == self.current.version:
+            self._stat = stat
+            return False
+        self.reload()
+        self._stat = stat
+        return True
+
+    def reload(self):
+        new = Dataset(MenuData.load(self.csv_path, self.snapshot_root))
+        old, self.current = self.current, new
+        self.reloads += 1
+        log.info('swapped dataset %s -> %s (%d rows)', old.version, new.version, len(new.df))
+        for hook in self.on_swap:
+            hook(old, new)
+        self._lease(new, old)
+        try:
+            for path in prune_snapshots(self.snapshot_root, keep=[new.data.path, old.data.path]):
+                log.info('removed old snapshot %s', path)
+        except OSError:
+            log.exception('pruning snapshots under %s failed', self.snapshot_root)
+        return new
@@ -0,0 +1,65 @@
+import plotly.express as px
+
+from app_metrics import metrics
+from menu_filters import filter_rows, macro_means
+from menu_scatter import scatter_figure, view_from_relayout
+
+#figure builders of the scatter and pie callbacks; they only need a Dataset, so the warm-up and the
+#tests can use them without the Dash app
+
+#standard values for the pie chart
+standard_protein = 50
+standard_carbs = 300
+standard_fat = 65
+
+#the scatter view of a fresh page, before any zoom
+default_view = view_from_relayout(None)
+
+
+def build_scatter(dataset, state, view, checkpoint=None):
+    #checkpoint, when given, is called between filtering and figure building to abandon stale work
+    with metrics.phase('filter'):
+        filtered_df = filter_rows(dataset, state)
+    metrics.record_rows(len(filtered_df))
+    if checkpoint:
+        checkpoint()
+    with metrics.phase('build'):
+        return scatter_figure(filtered_df, view)
+
+
+def pie_figure(dataset, state, checkpoint=None):
+    with metrics.phase('filter'):
+        avg_protein, avg_carbs, avg_fat = macro_means(dataset, state)
+    if checkpoint:
+        checkpoint()
+    nutrient_data = {
+        'Nutrient': ['Protein', 'Carbohydrates', 'Total Fat', 'Standard Protein', 'Standard Carbs', 'Standard Fat'],
+        'Value': [avg_protein, avg_carbs, avg_fat, standard_protein, standard_carbs, standard_fat]
+    }
+    with metrics.phase('build'):
+        fig = px.pie(nutrient_data, values='Value', names='Nutrient', title='Marco Composition for Selected Restaurants', hole=0.3)
+        fig.update_traces(textposition='outside', textinfo='percent+label')
+        fig.update_layout(
+            hovermode='closest'
+        )
+    return fig
+
+
+#(cache state, build) pairs for the warm-up, under the same cache states the callbacks use
+def scatter_cache_state(state):
+    return (state, default_view)
+
+
+def build_scatter_from_cache_state(dataset, cache_state):
+    state, view = cache_state
+    return build_scatter(dataset, state, view)
+
+
+def pie_cache_state(state):
+    return state
+
+
+warmup_figures = {
+    'scatter': (scatter_cache_state, build_scatter_from_cache_state),
+    'pie': (pie_cache_state, pie_figure),
+}
@@ -0,0 +1,86 @@
+import os
+from collections import namedtuple
+
+from menu_aggregates import means_from_totals
+from menu_table import table_order
+from row_cache import bytes_lru_cache
+
+#shared filter layer: the table, scatter and pie callbacks all receive the same six inputs,
+#so the matching row set is computed once per filter state and reused by every output
+FilterState = namedtuple('FilterState', ['restaurants', 'protein', 'carbs', 'fats', 'calories', 'search'])
+#slider columns in the same order as the FilterState range fields
+range_columns = [('protein', 'protein'), ('carbs', 'carbohydrates'), ('fats', 'total_fat'), ('calories', 'calories')]
+
+#memory budget of the row-set cache (ROW_CACHE_MB); table orders get half of it on top
+row_cache_bytes = int(os.environ.get('ROW_CACHE_MB', 128)) * 2 ** 20
+
+
+def _version_key(dataset, *args):
+    #entries are keyed by the dataset's version, not the Dataset: a request still running on an old
+    #version after a swap then only re-inserts arrays, instead of pinning the whole old dataset
+    return (dataset.version,) + args
+
+
+def _as_range(bounds):
+    if not bounds:
+        return None
+    return (float(bounds[0]), float(bounds[1]))
+
+
+def make_filter_state(restaurants, protein, carbs, fats, calories, search):
+    #normalizes the raw callback inputs so equivalent selections share one cache entry
+    return FilterState(
+        restaurants=tuple(sorted(set(restaurants or []))),
+        protein=_as_range(protein),
+        carbs=_as_range(carbs),
+        fats=_as_range(fats),
+        calories=_as_range(calories),
+        search=search.lower() if search else '',
+    )
+
+
+def state_ranges(state):
+    #(column, bounds) pairs for the sliders that have a value
+    return [(column, getattr(state, field)) for field, column in range_columns if getattr(state, field) is not None]
+
+
+@bytes_lru_cache(row_cache_bytes, key=_version_key)
+def filtered_positions(dataset, state):
+    #row positions matching the filter state; the dataset version is part of the key (cleared on reload)
+    positions = dataset.index.query(state.restaurants, state_ranges(state))
+    if state.search and len(positions):
+        positions = dataset.search.search(state.search, positions)
+    positions.setflags(write=False) #shared between callbacks, so keep it read-only
+    return positions
+
+
+def filter_rows(dataset, state):
+    return dataset.df.iloc[filtered_positions(dataset, state)]
+
+
+def macro_means(dataset, state):
+    #mean protein, carbohydrates and total fat of the filtered rows, from the aggregate cube when the
+    #state allows it (no search, at most one narrowed slider), otherwise from the shared row set
+    totals = None if state.search else dataset.cube.totals(state.restaurants, state_ranges(state))
+    if totals is None:
+        totals = dataset.cube.masked_totals(filtered_positions(dataset, state))
+    return means_from_totals(totals)
+
+
+@bytes_lru_cache(row_cache_bytes // 2, key=_version_key)
+def cached_table_order(dataset, state, sort, filter_query):
+    #display order of the table rows, cached so paging through a result only slices it
+    order = table_order(dataset.df, filtered_positions(dataset, state), sort, filter_query).astype(dataset.index.position_dtype)
+    order.setflags(write=False)
+    return order
+
+
+def clear_row_caches():
+    filtered_positions.cache_clear()
+    cached_table_order.cache_clear()
+
+
+def row_cache_gauges():
+    return [
+        ('dashboard_row_cache_bytes', 'Bytes held by the row-set and table-order caches.', filtered_positions.cache_bytes() + cached_table_order.cache_bytes()),
+    ]
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+#nutrient columns that back the range sliders
+range_columns = ['protein', 'carbohydrates', 'total_fat', 'calories']
+
+
+def sort_by_restaurant(df):
+    #groups each restaurant's rows into one contiguous block; codes follow first appearance
+    #and the sort is stable, so df['restaurant'].unique() keeps its original order
+    codes, _ = pd.factorize(df['restaurant'])
+    if not np.any(np.diff(codes) < 0):
+        return df #already grouped, e.g. loaded from a snapshot; avoid copying it
+    order = np.argsort(codes, kind='stable')
+    return df.iloc[order].reset_index(drop=True)
+
+
+class MenuIndex:
+    #query index built once per dataset: a restaurant -> row-range partition plus a sorted copy
+    #of every slider column, so a filter touches only the rows it could possibly match
+
+    def __init__(self, df, columns=range_columns):
+        self.n_rows = len(df)
+        self.position_dtype = np.int32 if self.n_rows < 2 ** 31 else np.intp
+        codes, names = pd.factorize(df['restaurant'])
+        if np.any(np.diff(codes) < 0):
+            raise ValueError('df must be sorted by restaurant, see sort_by_restaurant()')
+        self.codes = codes
+        self.restaurant_codes = {name: code for code, name in enumerate(names)}
+        #rows of restaurant code c are bounds[c]:bounds[c + 1]
+        self.bounds = np.searchsorted(codes, np.arange(len(names) + 1), side='left')
+        self.values = {}
+        self.order = {}
+        self.sorted_values = {}
+        for column in columns:
+            #values keep the column's own dtype (a view, not a copy); bounds are cast to match in query()
+            values = df[column].to_numpy()
+            order = np.argsort(values, kind='stable').astype(self.position_dtype)
+            self.values[column] = values
+            self.order[column] = order
+            self.sorted_values[column] = values[order]
+
+    def selected_codes(self, restaurants):
+        #sorted restaurant codes of the selection; unknown names are ignored like isin() would
+        return sorted({self.restaurant_codes[name] for name in restaurants if name in self.restaurant_codes})
+
+    def restaurant_slices(self, restaurants):
+        return [(self.bounds[code], self.bounds[code + 1]) for code in self.selected_codes(restaurants)]
+
+    def range_slice(self, column, low, high):
+        #rows with low <= value <= high are order[column][start:stop]; NaNs sort last and never match
+        sorted_values = self.sorted_values[column]
+        low, high = sorted_values.dtype.type(low), sorted_values.dtype.type(high)
+        start = np.searchsorted(sorted_values, low, side='left')
+        stop = np.searchsorted(sorted_values, high, side='right')
+        return start, max(start, stop)
+
+    def query(self, restaurants, ranges):
+        #restaurants is an iterable of names, ranges a list of (column, (low, high)) pairs;
+        #returns the matching row positions in ascending order, same as np.flatnonzero(mask)
+        blocks = self.restaurant_slices(restaurants)
+        n_candidates = sum(stop - start for start, stop in blocks)
+        if n_candidates == 0:
+            return np.empty(0, dtype=self.position_dtype)
+
+        narrowing = []
+        for column, (low, high) in ranges:
+            dtype = self.values[column].dtype.type
+            low, high = dtype(low), dtype(high)
+            start, stop = self.range_slice(column, low, high)
+            if stop - start == self.n_rows:
+                continue #the range covers every row, so it cannot remove anything
+            narrowing.append((stop - start, column, low, high, start, stop))
+        narrowing.sort(key=lambda entry: entry[0])
+
+        if narrowing and narrowing[0][0] < n_candidates:
+            #the tightest slider range is smaller than the restaurant selection: start from its slice
+            _, column, _, _, start, stop = narrowing.pop(0)
+            candidates = np.sort(self.order[column][start:stop])
+            selected = np.zeros(len(self.bounds) - 1, dtype=bool)
+            for block_start, _ in blocks:
+                selected[self.codes[block_start]] = True
+            candidates = candidates[selected[self.codes[candidates]]]
+        else:
+            candidates = np.concatenate([np.arange(start, stop, dtype=self.position_dtype) for start, stop in blocks])
+
+        for _, column, low, high, _, _ in narrowing:
+            values = self.values[column][candidates]
+            candidates = candidates[(values >= low) & (values <= high)]
+        return candidates
+
+
+if __name__ == '__main__':
+    #correctness check: the indexed results must match the pandas masks the callbacks used to build
+    rng = np.random.default_rng(0)
+    df = sort_by_restaurant(pd.read_csv('data.csv'))
+    index = MenuIndex(df)
+    restaurants = df['restaurant'].unique()
+    for trial in range(500):
+        chosen = list(rng.choice(restaurants, size=rng.integers(0, 20), replace=False))
+        ranges = []
+        mask = df['restaurant'].isin(chosen)
+        for column in range_columns:
+            if rng.random() < 0.5:
+                low, high = sorted(rng.uniform(df[column].min() - 1, df[column].max() + 1, size=2))
+                ranges.append((column, (low, high)))
+                mask &= (df[column] >= low) & (df[column] <= high)
+        expected = np.flatnonzero(mask.to_numpy())
+        actual = index.query(chosen, ranges)
+        assert np.array_equal(expected, actual), (chosen, ranges)
+    print('MenuIndex matches the pandas masks on 500 random filter states')
@@ -0,0 +1,84 @@
+import numpy as np
+import plotly.graph_objects as go
+
+#adaptive protein vs. carbohydrates plot: small selections are drawn point by point with WebGL,
+#large ones are binned on the server into a grid whose colour is the mean calories per bin, so the
+#payload depends on the grid resolution instead of the number of rows
+point_threshold = 5000
+grid_bins = 80
+colorscale = 'Plasma'
+
+
+def view_from_relayout(relayout_data):
+    #visible (x_range, y_range) after a zoom/pan, None for an axis that is autoscaled
+    x_range = y_range = None
+    if relayout_data:
+        if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+            x_range = (float(relayout_data['xaxis.range[0]']), float(relayout_data['xaxis.range[1]']))
+        if 'yaxis.range[0]' in relayout_data and 'yaxis.range[1]' in relayout_data:
+            y_range = (float(relayout_data['yaxis.range[0]']), float(relayout_data['yaxis.range[1]']))
+    return x_range, y_range
+
+
+def _in_view(values, bounds):
+    if bounds is None:
+        return np.ones(len(values), dtype=bool)
+    return (values >= bounds[0]) & (values <= bounds[1])
+
+
+def _axis_range(values, bounds):
+    if bounds is not None:
+        return bounds
+    if not len(values):
+        return (0.0, 1.0)
+    low, high = float(np.nanmin(values)), float(np.nanmax(values))
+    return (low, high) if high > low else (low - 0.5, high + 0.5)
+
+
+def density_grid(protein, carbs, calories, x_range, y_range, bins=grid_bins):
+    #(x edges, y edges, point count per bin, mean calories per bin) via vectorized 2D histograms
+    counts, x_edges, y_edges = np.histogram2d(protein, carbs, bins=bins, range=[x_range, y_range])
+    calorie_sums, _, _ = np.histogram2d(protein, carbs, bins=[x_edges, y_edges], weights=calories)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_calories = np.where(counts > 0, calorie_sums / counts, np.nan)
+    return x_edges, y_edges, counts, mean_calories
+
+
+def scatter_figure(rows, view=(None, None)):
+    protein = rows['protein'].to_numpy(dtype=np.float64)
+    carbs = rows['carbohydrates'].to_numpy(dtype=np.float64)
+    calories = rows['calories'].to_numpy(dtype=np.float64)
+    x_view, y_view = view
+    visible = _in_view(protein, x_view) & _in_view(carbs, y_view)
+    title = 'Protein vs. Carbohydrates'
+
+    if visible.sum() <= point_threshold:
+        names = rows['item_name'].to_numpy()[visible]
+        fig = go.Figure(go.Scattergl(
+            x=protein[visible], y=carbs[visible], mode='markers', text=names,
+            marker=dict(color=calories[visible], colorscale=colorscale, colorbar=dict(title='calories'), showscale=True),
+            hovertemplate='%{text}<br>protein=%{x}<br>carbohydrates=%{y}<br>calories=%{marker.color}<extra></extra>',
+        ))
+    else:
+        x_range = _axis_range(protein[visible], x_view)
+        y_range = _axis_range(carbs[visible], y_view)
+        x_edges, y_edges, counts, mean_calories = density_grid(protein[visible], carbs[visible], calories[visible], x_range, y_range)
+        #histogram2d indexes [x, y]; heatmaps want rows of y
+        fig = go.Figure(go.Heatmap(
+            x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+            z=mean_calories.T, customdata=counts.T, colorscale=colorscale, colorbar=dict(title='mean calories'),
+            hovertemplate='protein~%{x:.1f}<br>carbohydrates~%{y:.1f}<br>items=%{customdata:.0f}<br>mean calories=%{z:.0f}<extra></extra>',
+        ))
+        title += ' ({:,} items, binned)'.format(int(visible.sum()))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title='Protein (g)',
+        yaxis_title='Carbs (g)',
+        uirevision='scatter', #keep the user's zoom when the figure is replaced
+    )
+    if x_view is not None:
+        fig.update_xaxes(range=list(x_view))
+    if y_view is not None:
+        fig.update_yaxes(range=list(y_view))
+    return fig
@@ -0,0 +1,76 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+#length of the grams kept in the index; shorter queries fall back to checking every distinct name
+gram_size = 3
+
+
+def _grams(text):
+    return {text[i:i + gram_size] for i in range(len(text) - gram_size + 1)}
+
+
+class SearchIndex:
+    #inverted trigram index over the distinct lower-cased item names; search() returns the rows whose
+    #name contains the query as a literal, case-insensitive substring (no regex, so '(' is just a
+    #character). Names repeat heavily across restaurants and years, so the grams and the final
+    #substring check work on distinct names and only a vectorized lookup touches the rows
+
+    def __init__(self, names):
+        codes, uniques = pd.factorize(pd.Series(names).reset_index(drop=True))
+        lowered = pd.Series([name.lower() if isinstance(name, str) else '' for name in uniques], dtype=object)
+        #names differing only in case share one entry
+        name_codes, distinct = pd.factorize(lowered)
+        self.names = list(distinct)
+        #distinct name code per row; missing names point at an extra slot that never matches
+        lookup = np.append(name_codes, len(self.names)).astype(np.int32)
+        self.codes = lookup[codes]
+        postings = defaultdict(list)
+        for code, name in enumerate(self.names):
+            for gram in _grams(name):
+                postings[gram].append(code)
+        #codes are appended in order, so every posting list is already sorted
+        self.postings = {gram: np.array(entries, dtype=np.int32) for gram, entries in postings.items()}
+
+    def matching_names(self, query):
+        #codes of the distinct names containing query
+        query = query.lower()
+        if len(query) >= gram_size:
+            lists = []
+            for gram in _grams(query):
+                codes = self.postings.get(gram)
+                if codes is None:
+                    return []
+                lists.append(codes)
+            lists.sort(key=len)
+            codes = lists[0]
+            for other in lists[1:]:
+                if not len(codes):
+                    break
+                codes = np.intersect1d(codes, other, assume_unique=True)
+        else:
+            codes = range(len(self.names))
+        #the grams only say the pieces are there, so confirm the full substring once per name
+        names = self.names
+        return [code for code in codes if query in names[code]]
+
+    def search(self, query, candidates=None):
+        #candidates, when given, are sorted row positions to restrict the search to
+        hit = np.zeros(len(self.names) + 1, dtype=bool)
+        hit[self.matching_names(query)] = True
+        if candidates is not None:
+            return candidates[hit[self.codes[candidates]]]
+        return np.flatnonzero(hit[self.codes])
+
+
+if __name__ == '__main__':
+    #correctness check against a literal pandas substring match
+    df = pd.read_csv('data.csv')
+    index = SearchIndex(df['item_name'])
+    for query in ['chicken', 'Burger', 'ch', 'x', 'fries (', 'grilled chicken sand', 'zzzq', '']:
+        expected = np.flatnonzero(df['item_name'].str.contains(query, case=False, regex=False, na=False).to_numpy())
+        assert np.array_equal(index.search(query), expected), query
+        candidates = np.arange(0, len(df), 3)
+        assert np.array_equal(index.search(query, candidates), np.intersect1d(expected, candidates)), query
+    print('SearchIndex matches pandas literal substring search')
@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from menu_index import range_columns, sort_by_restaurant
+
+#binary snapshot of the cleaned csv: one directory per csv hash holding .npy column files that are
+#memory-mapped on load, so gunicorn workers share the column pages through the OS page cache
+default_csv = 'data.csv'
+default_snapshot_root = os.path.join('data', 'snapshot')
+manifest_name = 'manifest.json'
+#one file per serving process naming the snapshots it uses, so prune_snapshots leaves them alone
+leases_name = 'leases'
+#(mtime, size) -> sha256 of each csv seen, so booting against an unchanged csv does not rehash it
+hash_index_name = 'hashes.json'
+#bumped whenever the on-disk layout changes, so old snapshots are rebuilt instead of misread
+snapshot_format = 2
+#nutrients are stored as float32 to halve memory. This is lossy: the cleaning notebook's mean imputation
+#left values like 5.31527494 that float32 rounds, which is accepted since the table shows 2 decimals
+float_dtype = np.float32
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_file_hash(csv_path, snapshot_root=default_snapshot_root):
+    #file_hash, looked up by the csv's (st_mtime_ns, st_size) in the snapshot root's hash index and
+    #recomputed only when the stat changed, the same test DatasetManager.reload_if_changed uses
+    stat = os.stat(csv_path)
+    key = os.path.abspath(csv_path)
+    index_path = os.path.join(snapshot_root, hash_index_name)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    entry = index.get(key)
+    if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        return entry['sha256']
+    csv_hash = file_hash(csv_path)
+    index[key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': csv_hash}
+    os.makedirs(snapshot_root, exist_ok=True)
+    tmp = '{}.tmp-{}'.format(index_path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, index_path)
+    return csv_hash
+
+
+def snapshot_dir(csv_path=default_csv, snapshot_root=default_snapshot_root, csv_hash=None):
+    return os.path.join(snapshot_root, '{}-v{}'.format((csv_hash or file_hash(csv_path))[:16], snapshot_format))
+
+
+def build_snapshot(csv_path=default_csv, snapshot_root=default_snapshot_root):
+    csv_hash = cached_file_hash(csv_path, snapshot_root)
+    target = snapshot_dir(snapshot_root=snapshot_root, csv_hash=csv_hash)
+    if os.path.exists(os.path.join(target, manifest_name)):
+        return target
+
+    #rows are stored already grouped by restaurant, so loading never has to reorder (and copy) them
+    df = sort_by_restaurant(pd.read_csv(csv_path))
+    #the slider columns lead the float matrix so the dashboard can map them as one contiguous view
+    float_columns = [column for column in df.columns if df[column].dtype == np.float64]
+    float_columns.sort(key=lambda column: range_columns.index(column) if column in range_columns else len(range_columns))
+    other_numeric = [column for column in df.columns if column not in float_columns and pd.api.types.is_numeric_dtype(df[column])]
+    text_columns = [column for column in df.columns if column not in float_columns and column not in other_numeric]
+
+    os.makedirs(snapshot_root, exist_ok=True)
+    tmp = '{}.tmp-{}'.format(target, os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    #float columns go into one (n_columns, n_rows) matrix, the same layout as a pandas float block,
+    #so the DataFrame can wrap the memory map without copying it
+    np.save(os.path.join(tmp, 'floats.npy'), np.ascontiguousarray(df[float_columns].to_numpy(dtype=float_dtype).T))
+    for column in other_numeric:
+        np.save(os.path.join(tmp, column + '.npy'), df[column].to_numpy())
+    #text columns are dictionary encoded: int32 codes plus the list of distinct values (-1 is missing)
+    for column in text_columns:
+        codes, uniques = pd.factorize(df[column])
+        np.save(os.path.join(tmp, column + '.codes.npy'), codes.astype(np.int32))
+        with open(os.path.join(tmp, column + '.values.json'), 'w') as f:
+            json.dump([str(value) for value in uniques], f)
+    manifest = {
+        'format': snapshot_format,
+        'csv_sha256': csv_hash,
+        'rows': len(df),
+        'columns': list(df.columns),
+        'float_columns': float_columns,
+        'numeric_columns': other_numeric,
+        'text_columns': text_columns,
+    }
+    with open(os.path.join(tmp, manifest_name), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    #publish atomically; when several workers race to build the same snapshot the first rename wins
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.exists(os.path.join(target, manifest_name)):
+            raise
+    return target
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def lease_snapshots(snapshot_root, paths):
+    #records the snapshots this process serves (and still has requests on), replacing its earlier lease
+    directory = os.path.join(snapshot_root, leases_name)
+    os.makedirs(directory, exist_ok=True)
+    lease = os.path.join(directory, str(os.getpid()))
+    with open(lease + '.tmp', 'w') as f:
+        json.dump([os.path.basename(os.path.normpath(path)) for path in paths], f)
+    os.replace(lease + '.tmp', lease)
+
+
+def leased_snapshots(snapshot_root):
+    #snapshot names leased by live processes; leases of processes that have exited are removed
+    directory = os.path.join(snapshot_root, leases_name)
+    names = set()
+    if not os.path.isdir(directory):
+        return names
+    for entry in os.scandir(directory):
+        if not entry.name.isdigit():
+            continue
+        if not _process_alive(int(entry.name)):
+            os.remove(entry.path)
+            continue
+        try:
+            with open(entry.path) as f:
+                names.update(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return names
+
+
+def prune_snapshots(snapshot_root=default_snapshot_root, keep=()):
+    #removes the snapshot directories that are neither in keep nor leased by a live process (another
+    #worker's unfinished .tmp build is left alone either)
+    keep = {os.path.basename(os.path.normpath(path)) for path in keep} | leased_snapshots(snapshot_root)
+    removed = []
+    for entry in os.scandir(snapshot_root):
+        if entry.is_dir() and re.fullmatch(r'[0-9a-f]{16}-v\d+', entry.name) and entry.name not in keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed.append(entry.path)
+    return removed
+
+
+def read_manifest(path):
+    with open(os.path.join(path, manifest_name)) as f:
+        return json.load(f)
+
+
+def load_column(path, manifest, column, categorical=False):
+    #loads a single column on its own; numeric columns stay memory-mapped, text columns are rebuilt
+    #from their dictionary so repeated values share one string object (or become a categorical)
+    if column in manifest['float_columns']:
+        floats = np.load(os.path.join(path, 'floats.npy'), mmap_mode='r')
+        return floats[manifest['float_columns'].index(column)]
+    if column in manifest['numeric_columns']:
+        return np.load(os.path.join(path, column + '.npy'), mmap_mode='r')
+    codes = np.load(os.path.join(path, column + '.codes.npy'), mmap_mode='r')
+    with open(os.path.join(path, column + '.values.json')) as f:
+        values = json.load(f)
+    if categorical:
+        return pd.Categorical.from_codes(codes, categories=values)
+    return np.array(values + [np.nan], dtype=object)[codes]
+
+
+def load_snapshot(path, columns=None, categorical=()):
+    manifest = read_manifest(path)
+    if columns is None:
+        columns = manifest['columns']
+    all_floats = manifest['float_columns']
+    floats = [column for column in all_floats if column in columns]
+    matrix = np.load(os.path.join(path, 'floats.npy'), mmap_mode='r')
+    if floats == all_floats[:len(floats)]:
+        block = matrix[:len(floats)] #leading rows of the matrix: still a view of the memory map
+    else:
+        block = matrix[[all_floats.index(column) for column in floats]]
+    df = pd.DataFrame(block.T, columns=floats, copy=False)
+    for column in columns:
+        if column not in floats:
+            df[column] = load_column(path, manifest, column, column in categorical)
+    #columns stay grouped by type rather than in csv order: reindexing them would copy the mapped block
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the cleaned menu csv into a memory-mappable snapshot.')
+    parser.add_argument('csv', nargs='?', default=default_csv)
+    parser.add_argument('--snapshot-root', default=default_snapshot_root)
+    args = parser.parse_args()
+    print(build_snapshot(args.csv, args.snapshot_root))
@@ -0,0 +1,116 @@
+import numpy as np
+
+#server-side paging, sorting and filtering for the menu items DataTable: the browser only ever
+#receives the rows of the page it is showing
+
+#(column id, header) pairs shown in the table
+table_columns = [
+    ('restaurant', 'Restaurant'),
+    ('item_name', 'Item Name'),
+    ('protein', 'Protein (g)'),
+    ('carbohydrates', 'Carbs (g)'),
+    ('total_fat', 'Fats (g)'),
+    ('calories', 'Calories'),
+]
+text_columns = ['restaurant', 'item_name']
+page_size = 15
+#rows are listed by calories until the user picks a sort column
+default_sort = (('calories', 'asc'),)
+
+#operators of the DataTable filter_query syntax, longest spellings first so '>=' is not read as '>'
+#(i/s prefixes are the case-insensitive/sensitive variants; text matching here is always case-insensitive)
+filter_operators = [
+    ('icontains', 'contains'), ('scontains', 'contains'), ('ieq', 'eq'), ('seq', 'eq'), ('ine', 'ne'), ('sne', 'ne'),
+    ('>=', 'ge'), ('<=', 'le'), ('!=', 'ne'), ('>', 'gt'), ('<', 'lt'), ('=', 'eq'),
+    ('ge', 'ge'), ('le', 'le'), ('ne', 'ne'), ('gt', 'gt'), ('lt', 'lt'), ('eq', 'eq'),
+    ('contains', 'contains'), ('datestartswith', 'startswith'),
+]
+
+
+def table_column_specs():
+    return [{'name': name, 'id': column, 'type': 'text' if column in text_columns else 'numeric'} for column, name in table_columns]
+
+
+def sort_key(sort_by):
+    #hashable form of the DataTable sort_by property, used in cache keys
+    if not sort_by:
+        return default_sort
+    return tuple((entry['column_id'], entry['direction']) for entry in sort_by)
+
+
+def parse_filter_query(filter_query):
+    #'{calories} > 300 && {item_name} contains salad' -> [('calories', 'gt', '300'), ('item_name', 'contains', 'salad')]
+    clauses = []
+    for part in (filter_query or '').split(' && '):
+        part = part.strip()
+        if not part.startswith('{') or '}' not in part:
+            continue
+        column, rest = part[1:].split('}', 1)
+        rest = rest.strip()
+        for spelling, operator in filter_operators:
+            if rest.startswith(spelling):
+                value = rest[len(spelling):].strip()
+                if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+                    value = value[1:-1]
+                clauses.append((column, operator, value))
+                break
+    return clauses
+
+
+def apply_filter(rows, clauses):
+    for column, operator, value in clauses:
+        if column not in rows:
+            continue
+        if column in text_columns:
+            values = rows[column].astype(str).str.lower()
+            value = value.lower()
+            if operator == 'contains':
+                keep = values.str.contains(value, regex=False)
+            elif operator == 'startswith':
+                keep = values.str.startswith(value)
+            elif operator == 'ne':
+                keep = values != value
+            else:
+                keep = values == value
+        else:
+            try:
+                number = float(value)
+            except ValueError:
+                continue
+            values = rows[column].astype(float)
+            keep = {
+                'ge': values >= number, 'le': values <= number, 'gt': values > number,
+                'lt': values < number, 'ne': values != number,
+            }.get(operator, values == number)
+        rows = rows[keep.to_numpy()]
+    return rows
+
+
+def sort_rows(rows, sort):
+    columns = [column for column, _ in sort if column in rows]
+    if not columns:
+        return rows
+    ascending = [direction == 'asc' for column, direction in sort if column in rows]
+    #text columns sort alphabetically, not in the categorical code order
+    key = lambda values: values.astype(str) if values.name in text_columns else values
+    return rows.sort_values(by=columns, ascending=ascending, kind='mergesort', key=key)
+
+
+def table_order(df, positions, sort, filter_query):
+    #row positions of the table in display order, after the column filters typed into the table
+    rows = apply_filter(df.iloc[positions], parse_filter_query(filter_query))
+    return df.index.get_indexer(sort_rows(rows, sort).index)
+
+
+def page_records(df, order, page_current):
+    #returns (records, page count, page shown); out of range pages snap to the last one
+    page_count = max(1, -(-len(order) // page_size))
+    page = min(max(page_current or 0, 0), page_count - 1)
+    page_rows = df.iloc[order[page * page_size:(page + 1) * page_size]]
+    records = []
+    for row in page_rows[[column for column, _ in table_columns]].itertuples(index=False):
+        records.append({
+            column: (str(value) if column in text_columns else round(float(value), 2) if not np.isnan(value) else None)
+            for (column, _), value in zip(table_columns, row)
+        })
+    return records, page_count, page
@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from figure_cache import figure_json
+from menu_index import range_columns
+
+log = logging.getLogger('dashboard.warmup')
+
+#positions of the six filter inputs among each callback's arguments in the slow-request log, in
+#make_filter_state order: restaurants, protein, carbs, fats, calories, search
+log_input_positions = {
+    'menu_items': (0, 1, 2, 3, 4, 5),
+    'scatter': (0, 2, 3, 4, 5, 1),
+    'pie': (0, 2, 3, 4, 5, 1),
+}
+
+def full_ranges(dataset):
+    return [list(dataset.slider_bounds[column]) for column in range_columns]
+
+
+def default_inputs(dataset, top_restaurants=10):
+    #the first views of a session: the empty page, then one of the most common restaurants with the
+    #sliders at their full range and no search
+    ranges = full_ranges(dataset)
+    popular = dataset.df['restaurant'].value_counts().index[:top_restaurants]
+    return [([], *ranges, None)] + [([str(name)], *ranges, None) for name in popular]
+
+
+def inputs_from_file(path, dataset):
+    #a JSON list of objects with any of restaurants, protein, carbs, fats, calories and search;
+    #a missing slider means its full range
+    with open(path) as f:
+        entries = json.load(f)
+    ranges = dict(zip(['protein', 'carbs', 'fats', 'calories'], full_ranges(dataset)))
+    return [(entry.get('restaurants', []),
+             *[entry.get(field, ranges[field]) for field in ['protein', 'carbs', 'fats', 'calories']],
+             entry.get('search')) for entry in entries]
+
+
+def inputs_from_log(path):
+    #the filter inputs of every callback in the slow-request log (JSON lines, see app_metrics)
+    inputs = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                positions = log_input_positions[entry['callback']]
+                inputs.append(tuple(entry['inputs'][i] for i in positions))
+            except (ValueError, KeyError, IndexError, TypeError):
+                continue
+    return inputs
+
+
+class Warmer:
+    #precomputes popular filter states for a dataset version, once per worker and after every swap, on a
+    #background thread so the worker keeps serving: row sets and table orders are filled in this
+    #worker's caches, serialized figures go into the figure cache (and so its shared backend).
+    #figures maps a figure name to (cache_state, build): cache_state turns a FilterState into the state
+    #the callback caches under, build(dataset, cache_state) makes the figure. A few dozen states take
+    #seconds, so they are built on the warm-up thread itself rather than in a process pool, which would
+    #have to load the dataset (and under `python project_app.py` the whole app) again per process
+
+    def __init__(self, dataset_manager, figure_cache, make_state, figures, warm_rows,
+                 states_file=None, log_path=None, log_states=20, top_restaurants=10, claim=None):
+        self.dataset_manager = dataset_manager
+        self.figure_cache = figure_cache
+        self.make_state = make_state
+        self.figures = figures
+        self.warm_rows = warm_rows
+        self.states_file = states_file
+        self.log_path = log_path
+        self.log_states = log_states
+        self.top_restaurants = top_restaurants
+        #claim(version) -> bool; lets one worker build the figures of a version for a shared backend
+        self.claim = claim
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started_pid = None
+        self.runs = 0
+        self.figures_warmed = 0
+        self.last_states = 0
+        self.last_seconds = 0.0
+
+    def states(self, dataset):
+        inputs = default_inputs(dataset, self.top_restaurants)
+        if self.states_file:
+            inputs += inputs_from_file(self.states_file, dataset)
+        states = [self.make_state(*args) for args in inputs]
+        if self.log_path and os.path.exists(self.log_path):
+            counts = Counter(self.make_state(*args) for args in inputs_from_log(self.log_path))
+            states += [state for state, _ in counts.most_common(self.log_states)]
+        return list(dict.fromkeys(states))
+
+    def start(self, dataset=None):
+        thread = threading.Thread(target=self.run, args=(dataset or self.dataset_manager.current,),
+                                  name='cache-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def ensure_started(self):
+        #warms the current version once per process; called per request like
+        #DatasetManager.ensure_watching, so it runs in each worker rather than a preloading master
+        if self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self.start()
+
+    def on_swap(self, old, new):
+        self.start(new)
+
+    def run(self, dataset):
+        try:
+            with self._lock:
+                self._run(dataset)
+        except Exception:
+            log.exception('warming version %s failed', dataset.version)
+
+    def _run(self, dataset):
+        #a newer version was swapped in while this run waited for the previous one
+        if dataset is not self.dataset_manager.current:
+            return
+        started = time.perf_counter()
+        states = self.states(dataset)
+        for state in states:
+            self.warm_rows(dataset, state)
+        warmed = 0
+        if self.figures and (self.claim is None or self.claim(dataset.version)):
+            for state in states:
+                #stop early once a newer version has been swapped in
+                if dataset is not self.dataset_manager.current:
+                    break
+                for name, (cache_state, build) in self.figures.items():
+                    key_state = cache_state(state)
+                    key = self.figure_cache.make_key(name, dataset.version, key_state)
+                    try:
+                        payload = figure_json(build(dataset, key_state))
+                    except Exception:
+                        log.exception('warm-up figure %s failed', name)
+                        continue
+                    self.figure_cache.set(key, payload)
+                    warmed += 1
+        self.runs += 1
+        self.figures_warmed += warmed
+        self.last_states = len(states)
+        self.last_seconds = time.perf_counter() - started
+        log.info('warmed %d states (%d figures) of version %s in %.2f s', len(states), warmed, dataset.version, self.last_seconds)
+
+    def gauges(self):
+        return [
+            ('dashboard_warmup_runs_total', 'Cache warm-ups completed by this worker.', self.runs),
+            ('dashboard_warmup_figures_total', 'Figures this worker built during warm-ups.', self.figures_warmed),
+            ('dashboard_warmup_states', 'Filter states in the last warm-up.', self.last_states),
+            ('dashboard_warmup_seconds', 'Duration of the last warm-up.', self.last_seconds),
+        ]
+
+
+def warmer_from_env(dataset_manager, figure_cache, make_state, figures, warm_rows, claim=None, environ=os.environ):
+    #WARMUP=0 turns warm-up off; WARMUP_STATES is a JSON file of extra states; WARMUP_FROM_LOG (default
+    #SLOW_CALLBACK_LOG) adds the WARMUP_LOG_STATES most frequent states of the slow-request log;
+    #WARMUP_RESTAURANTS is how many popular single-restaurant views to warm
+    if environ.get('WARMUP', '1') == '0':
+        return None
+    return Warmer(
+        dataset_manager, figure_cache, make_state, figures, warm_rows,
+        states_file=environ.get('WARMUP_STATES'),
+        log_path=environ.get('WARMUP_FROM_LOG', environ.get('SLOW_CALLBACK_LOG')),
+        log_states=int(environ.get('WARMUP_LOG_STATES', 20)),
+        top_restaurants=int(environ.get('WARMUP_RESTAURANTS', 10)),
+        claim=claim,
+    )
@@ -1,240 +1,383 @@
-from dash import Dash, dcc, html, Input, Output
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
+from dash import Dash, ctx, dcc, html, dash_table, Input, Output, State, ClientsideFunction
+from dash.exceptions import MissingCallbackContextException
+import os
+import uuid
+from menu_dataset import DatasetManager
+from menu_filters import cached_table_order, clear_row_caches, make_filter_state, row_cache_gauges
+from menu_figures import build_scatter, pie_figure, standard_carbs, standard_fat, standard_protein, warmup_figures
+from menu_scatter import view_from_relayout
+from figure_cache import cache_from_env
+from app_metrics import figure_cache_gauges, metrics
+from flask import abort, jsonify
+from menu_clientside import encode_dataset
+from request_coalescing import SequenceTracker, shared_cache
+from menu_warmup import warmer_from_env
+from menu_table import page_records, page_size, sort_key, table_column_specs
 
-#load the dataset
-df = pd.read_csv('data.csv')
+#load the compact dataset from its memory-mapped snapshot (rebuilt only when data.csv changes) together
+#with its indexes and aggregates; the manager swaps in a new version when the csv is republished
+#MENU_DATA_CSV/MENU_SNAPSHOT_ROOT point the app at another dataset, e.g. the benchmark's synthetic ones,
+#DATASET_POLL_SECONDS sets how often the csv is checked for changes (0 turns reloading off)
+dataset_manager = DatasetManager(
+    os.environ.get('MENU_DATA_CSV', 'data.csv'),
+    os.environ.get('MENU_SNAPSHOT_ROOT', os.path.join('data', 'snapshot')),
+    poll_seconds=float(os.environ.get('DATASET_POLL_SECONDS', 30)),
+)
+#serialized scatter/pie figures keyed by filter state, optionally shared between workers (see cache_from_env)
+figure_cache = cache_from_env()
 
 #initialize the Dash app w/ server
 app = Dash(__name__, external_stylesheets=['https://cdnjs.cloudflare.com/ajax/libs/bulma/0.9.3/css/bulma.min.css'])
 server = app.server
 
-#define the minimum and maximum values for the nutrient range sliders/constant values for future callbacks
-min_protein = df['protein'].min()
-max_protein = df['protein'].max()
-min_carbs = df['carbohydrates'].min()
-max_carbs = df['carbohydrates'].max()
-min_fats = df['total_fat'].min()
-max_fats = df['total_fat'].max()
-min_calories = df['calories'].min()
-max_calories = df['calories'].max()
-#standard values for the pie chart (shown below)
-standard_protein = 50
-standard_carbs = 300
-standard_fat = 65
-
-#layout with components
-app.layout = html.Div(children=[
-    #header
-    html.Div([
-        html.H1('Foods from American Restaurants Classified through Nutritional Value', className='title is-1 has-text-centered', style={'font': 'Helvetica','color': 'white', 'backgroundColor': '#8BB174', 'padding': '20px'}),
-    ], style={'marginBottom': '20px'}),
-    #dashboard introduction
-    html.Div([
+#hit/miss statistics of the figure cache
+@server.route('/cache-stats')
+def cache_stats():
+    return jsonify(figure_cache.stats())
+
+#callback latency/payload instrumentation, scraped from /metrics
+metrics.init_app(server)
+metrics.gauges.append(figure_cache_gauges(figure_cache))
+metrics.gauges.append(lambda: [
+    ('dashboard_dataset_rows', 'Rows in the dataset being served.', len(dataset_manager.current.df)),
+    ('dashboard_dataset_reloads_total', 'Dataset versions swapped in since the worker started.', dataset_manager.reloads),
+])
+
+#watch the csv for a republished dataset from inside each worker
+server.before_request(dataset_manager.ensure_watching)
+
+#request coalescing: callbacks for filter states the session has already moved past are dropped using
+#per-session sequence numbers, shared by the workers through a diskcache directory (COALESCE_CACHE_DIR)
+#when diskcache is installed
+coalesce_cache = shared_cache(os.environ.get('COALESCE_CACHE_DIR', os.path.join('data', 'callback_cache')))
+sequence_tracker = SequenceTracker(coalesce_cache)
+metrics.gauges.append(sequence_tracker.gauges)
+
+#client-side filtering mode (CLIENTSIDE_FILTERING=1): the browser gets a compact copy of the dataset once
+#and computes the scatter plot and pie chart itself (assets/clientside.js); only the table stays on the server
+clientside_mode = os.environ.get('CLIENTSIDE_FILTERING') == '1'
+
+def server_callback(*args, **kwargs):
+    #app.callback for the outputs that client-side mode takes over in the browser
+    if clientside_mode:
+        return lambda func: func
+    return app.callback(*args, **kwargs)
+
+#layout with components, built per page load so new sessions get the current slider limits and options
+def serve_layout():
+    dataset = dataset_manager.current
+    #define the minimum and maximum values for the nutrient range sliders
+    min_protein, max_protein = dataset.slider_bounds['protein']
+    min_carbs, max_carbs = dataset.slider_bounds['carbohydrates']
+    min_fats, max_fats = dataset.slider_bounds['total_fat']
+    min_calories, max_calories = dataset.slider_bounds['calories']
+    return html.Div(children=[
+        #header
         html.Div([
-            html.H3([html.Strong('Dashboard Introduction')], className='card-title1'),
-            html.P("This dashboard allows you to explore the nutritional makeup of menu items from various American restaurants. Customize your analysis by filtering items based on your dietary preferences and requirements. The visualizations provide insights into nutrient distribution, aiding in informed decision-making for healthier eating habits. Discover and compare the nutritional value of restaurant offerings to support your dietary goals.", className='card-text', style={'padding': '5px 0'})
-        ], className='card border-primary mb-3', style={'text-align':'justify', 'padding': '20px'})
-    ], className='container'),
-    #dropdowns
-    html.Div([
+            html.H1('Foods from American Restaurants Classified through Nutritional Value', className='title is-1 has-text-centered', style={'font': 'Helvetica','color': 'white', 'backgroundColor': '#8BB174', 'padding': '20px'}),
+        ], style={'marginBottom': '20px'}),
+        #dashboard introduction
         html.Div([
             html.Div([
-                html.Label('Select Restaurants', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
-                dcc.Dropdown(
-                    id='multiple-restaurant-dropdown',
-                    options=[{'label': restaurant, 'value': restaurant} for restaurant in df['restaurant'].unique()],
-                    multi=True,
-                    value=[],
-                ),
-            ], className='box is-rounded'),
-            html.Div([
-                html.Label('Search', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
-                dcc.Input(
-                    id='search-input',
-                    type='text',
-                    placeholder='Search items...',
-                    debounce=True,
-                ),
-            ], className='box is-rounded'),
-        ], className='column is-one-fifth'),
+                html.H3([html.Strong('Dashboard Introduction')], className='card-title1'),
+                html.P("This dashboard allows you to explore the nutritional makeup of menu items from various American restaurants. Customize your analysis by filtering items based on your dietary preferences and requirements. The visualizations provide insights into nutrient distribution, aiding in informed decision-making for healthier eating habits. Discover and compare the nutritional value of restaurant offerings to support your dietary goals.", className='card-text', style={'padding': '5px 0'})
+            ], className='card border-primary mb-3', style={'text-align':'justify', 'padding': '20px'})
+        ], className='container'),
+        #dropdowns
         html.Div([
             html.Div([
-                html.Label('Select Protein Range (g)', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
-                dcc.RangeSlider(
-                    id='protein-range-slider',
-                    min=min_protein,
-                    max=max_protein,
-                    marks={int(pro): str(pro) for pro in range(int(min_protein), int(max_protein) + 1, 10)},
-                    value=[min_protein, max_protein],
-                ),
-            ], className='box is-rounded'),
-        ], className='column is-one-fifth'),
-        html.Div([
+                html.Div([
+                    html.Label('Select Restaurants', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
+                    dcc.Dropdown(
+                        id='multiple-restaurant-dropdown',
+                        options=[{'label': restaurant, 'value': restaurant} for restaurant in dataset.restaurants],
+                        multi=True,
+                        value=[],
+                    ),
+                ], className='box is-rounded'),
+                html.Div([
+                    html.Label('Search', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
+                    dcc.Input(
+                        id='search-input',
+                        type='text',
+                        placeholder='Search items...',
+                        debounce=True,
+                    ),
+                ], className='box is-rounded'),
+            ], className='column is-one-fifth'),
             html.Div([
-                html.Label('Select Carbs Range (g)', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
-                dcc.RangeSlider(
-                    id='carbs-range-slider',
-                    min=min_carbs,
-                    max=max_carbs,
-                    marks={int(carb): str(carb) for carb in range(int(min_carbs), int(max_carbs) + 1, 20)},
-                    value=[min_carbs, max_carbs],
-                ),
-            ], className='box is-rounded'),
-        ], className='column is-one-fifth'),
-        html.Div([
+                html.Div([
+                    html.Label('Select Protein Range (g)', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
+                    dcc.RangeSlider(
+                        id='protein-range-slider',
+                        min=min_protein,
+                        max=max_protein,
+                        marks={int(pro): str(pro) for pro in range(int(min_protein), int(max_protein) + 1, 10)},
+                        value=[min_protein, max_protein],
+                        updatemode='mouseup', #only fire once the handle is released
+                    ),
+                ], className='box is-rounded'),
+            ], className='column is-one-fifth'),
             html.Div([
-                html.Label('Select Fats Range (g)', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
-                dcc.RangeSlider(
-                    id='fats-range-slider',
-                    min=min_fats,
-                    max=max_fats,
-                    marks={int(fat): str(fat) for fat in range(int(min_fats), int(max_fats) + 1, 10)},
-                    value=[min_fats, max_fats],
-                ),
-            ], className='box is-rounded'),
-        ], className='column is-one-fifth'),
-        html.Div([
+                html.Div([
+                    html.Label('Select Carbs Range (g)', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
+                    dcc.RangeSlider(
+                        id='carbs-range-slider',
+                        min=min_carbs,
+                        max=max_carbs,
+                        marks={int(carb): str(carb) for carb in range(int(min_carbs), int(max_carbs) + 1, 20)},
+                        value=[min_carbs, max_carbs],
+                        updatemode='mouseup', #only fire once the handle is released
+                    ),
+                ], className='box is-rounded'),
+            ], className='column is-one-fifth'),
             html.Div([
-                html.Label('Select Caloric Range', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
-                dcc.RangeSlider(
-                    id='caloric-range-slider',
-                    min=min_calories,
-                    max=max_calories,
-                    marks={int(cal): str(cal) for cal in range(int(min_calories), int(max_calories) + 1, 200)},
-                    value=[min_calories, max_calories],
-                ),
-            ], className='box is-rounded'),
-        ], className='column is-one-fifth'),
-    ], className='columns', style={'marginBottom': '20px', 'margin': '20px'}),
+                html.Div([
+                    html.Label('Select Fats Range (g)', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
+                    dcc.RangeSlider(
+                        id='fats-range-slider',
+                        min=min_fats,
+                        max=max_fats,
+                        marks={int(fat): str(fat) for fat in range(int(min_fats), int(max_fats) + 1, 10)},
+                        value=[min_fats, max_fats],
+                        updatemode='mouseup', #only fire once the handle is released
+                    ),
+                ], className='box is-rounded'),
+            ], className='column is-one-fifth'),
+            html.Div([
+                html.Div([
+                    html.Label('Select Caloric Range', className='label has-text-white has-background-dark is-rounded has-text-centered', style={'fontWeight': 'bold', 'padding': '10px'}),
+                    dcc.RangeSlider(
+                        id='caloric-range-slider',
+                        min=min_calories,
+                        max=max_calories,
+                        marks={int(cal): str(cal) for cal in range(int(min_calories), int(max_calories) + 1, 200)},
+                        value=[min_calories, max_calories],
+                        updatemode='mouseup', #only fire once the handle is released
+                    ),
+                ], className='box is-rounded'),
+            ], className='column is-one-fifth'),
+        ], className='columns', style={'marginBottom': '20px', 'margin': '20px'}),
     
-    #visualizations
-    html.Div([
-    html.Div(id='menu-items-output', className='column is-one-half', style={'paddingRight': '20px'}), #table layout
-    html.Div([ #graphs layout
-        dcc.Graph(id='scatter-plot', className='col-lg-6 col-md-6 col-sm-12', style={'width': '100%', 'height': '100%', 'marginBottom': '15px'}),
-        html.P('This scatter plot shows the protein and carbohydrate content of the selected items from each restaurant. The color of the points represents the caloric content of the items.'),
-        dcc.Graph(id='pie-chart', className='col-lg-6 col-md-6 col-sm-12', style={'width': '100%', 'height': '100%'}),
-        html.P('The default values for these are the recommended macronutrient values for a 2000 calorie diet. When selected, the pie chart shows the average macronutrient composition of the selected items from each restaurant.'),
-    ], className='column', style={'display': 'flex', 'flexDirection': 'column', 'width': '100%', 'height': '100%', 'overflowX': 'auto','marginRight': '40px'})
-], className='columns'),
-    #dashboard footer with link to github + project background
-    html.Div([
-        html.Footer([ 
-        html.P([html.Strong('Dataset Provenance')]),
-        html.P("The dataset is sourced from MenuStat and serves as a valuable resource for researchers, policymakers, and health professionals interested in restaurant food nutrition. Developed by the New York City Department of Health and Mental Hygiene and now managed by Harvard Pilgrim Health Care Institute, MenuStat aims to provide comprehensive insights into restaurant food nutrition. This dataset holds significant relevance due to the pivotal role that out-of-home dining plays in shaping the American diet. Studies have shown that meals consumed away from home contribute substantially to daily caloric intake, constituting approximately one-third of total calories consumed, and represent nearly half of an average household's food expenditure. My interest lies in delving deep into the diverse spectrum of nutrients present in these restaurant offerings and exploring how they contribute to overall dietary patterns."),
-        html.P(" "),
-        html.P('This dashboard was created by Shriya Dale for DS 4003.'),
-        html.P(['See the GitHub repository with all work for this project ',html.A('here', 
-            href='https://github.com/ShriyaDale/DS-4003_SD/tree/main', className='text-success'),'.'])
-            ], className='row text-light bg-dark p-4', style={'text-align':'center', 'backgroundColor': '#8BB174'})
-        ], className='container-fluid')
-    ], style={'backgroundColor': '#C1E1C1'}
-)
-#callbacks for menu tables
+        #visualizations
+        html.Div([
+        html.Div(id='menu-items-output', className='column is-one-half', style={'paddingRight': '20px'}, children=[ #table layout
+            html.Div(id='menu-items-message', className='column is-full'),
+            #one server-side table for every selected restaurant: paging, sorting and filtering run in the
+            #update_menu_items callback, so only the visible page is ever sent to the browser
+            dash_table.DataTable(
+                id='menu-items-table',
+                columns=table_column_specs(),
+                data=[],
+                page_current=0,
+                page_size=page_size,
+                page_action='custom',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
+                style_header={'backgroundColor': '#426B69', 'color': 'white', 'fontWeight': 'bold'},
+                style_cell={'backgroundColor': 'lavender', 'textAlign': 'left', 'whiteSpace': 'normal', 'height': 'auto'},
+                style_table={'overflowX': 'auto'},
+            ),
+        ]),
+        html.Div([ #graphs layout
+            #sequence number of the current filter state in this browser session, see request_coalescing
+            dcc.Store(id='filter-seq', data={'session': uuid.uuid4().hex, 'seq': 0}),
+            #only a reference: the dataset itself comes from /menu-data/<version>.json, cached by the browser
+            dcc.Store(id='menu-data-store', data={
+                'version': dataset.version,
+                'url': app.get_relative_path('/menu-data/{}.json'.format(dataset.version)),
+                'standard': {'protein': standard_protein, 'carbs': standard_carbs, 'fat': standard_fat},
+            } if clientside_mode else None),
+            #version of the payload once the browser has fetched and decoded it; the interval polls for that
+            dcc.Store(id='menu-data-ready'),
+            dcc.Interval(id='menu-data-poll', interval=200, disabled=not clientside_mode),
+            dcc.Graph(id='scatter-plot', className='col-lg-6 col-md-6 col-sm-12', style={'width': '100%', 'height': '100%', 'marginBottom': '15px'}),
+            html.P('This scatter plot shows the protein and carbohydrate content of the selected items from each restaurant. The color of the points represents the caloric content of the items.'),
+            dcc.Graph(id='pie-chart', className='col-lg-6 col-md-6 col-sm-12', style={'width': '100%', 'height': '100%'}),
+            html.P('The default values for these are the recommended macronutrient values for a 2000 calorie diet. When selected, the pie chart shows the average macronutrient composition of the selected items from each restaurant.'),
+        ], className='column', style={'display': 'flex', 'flexDirection': 'column', 'width': '100%', 'height': '100%', 'overflowX': 'auto','marginRight': '40px'})
+    ], className='columns'),
+        #dashboard footer with link to github + project background
+        html.Div([
+            html.Footer([ 
+            html.P([html.Strong('Dataset Provenance')]),
+            html.P("The dataset is sourced from MenuStat and serves as a valuable resource for researchers, policymakers, and health professionals interested in restaurant food nutrition. Developed by the New York City Department of Health and Mental Hygiene and now managed by Harvard Pilgrim Health Care Institute, MenuStat aims to provide comprehensive insights into restaurant food nutrition. This dataset holds significant relevance due to the pivotal role that out-of-home dining plays in shaping the American diet. Studies have shown that meals consumed away from home contribute substantially to daily caloric intake, constituting approximately one-third of total calories consumed, and represent nearly half of an average household's food expenditure. My interest lies in delving deep into the diverse spectrum of nutrients present in these restaurant offerings and exploring how they contribute to overall dietary patterns."),
+            html.P(" "),
+            html.P('This dashboard was created by Shriya Dale for DS 4003.'),
+            html.P(['See the GitHub repository with all work for this project ',html.A('here', 
+                href='https://github.com/ShriyaDale/DS-4003_SD/tree/main', className='text-success'),'.'])
+                ], className='row text-light bg-dark p-4', style={'text-align':'center', 'backgroundColor': '#8BB174'})
+            ], className='container-fluid')
+        ], style={'backgroundColor': '#C1E1C1'}
+    )
+
+app.layout = serve_layout
+
+def invalidate_caches(old, new):
+    #row sets and figures of the old version are never asked for again, so free them right away;
+    #requests still running on the old dataset keep their own reference to it
+    clear_row_caches()
+    figure_cache.clear(include_backend=False)
+
+dataset_manager.on_swap.append(invalidate_caches)
+metrics.gauges.append(row_cache_gauges)
+
+#components whose change starts the table over at its first page
+filter_component_ids = {'multiple-restaurant-dropdown', 'protein-range-slider', 'carbs-range-slider', 'fats-range-slider',
+                        'caloric-range-slider', 'search-input', 'filter-seq'}
+
+def filters_triggered():
+    try:
+        triggered = set(ctx.triggered_prop_ids.values())
+    except MissingCallbackContextException: #called directly, e.g. by the benchmark
+        return True
+    return bool(triggered & filter_component_ids)
+
+#callback for the menu items table
 @app.callback(
-    Output('menu-items-output', 'children'),
+    [Output('menu-items-table', 'data'),
+     Output('menu-items-table', 'page_count'),
+     Output('menu-items-table', 'page_current'),
+     Output('menu-items-message', 'children')],
     [Input('multiple-restaurant-dropdown', 'value'),
      Input('protein-range-slider', 'value'),
      Input('carbs-range-slider', 'value'),
      Input('fats-range-slider', 'value'),
      Input('caloric-range-slider', 'value'),
-     Input('search-input', 'value')]
+     Input('search-input', 'value'),
+     Input('menu-items-table', 'page_current'),
+     Input('menu-items-table', 'sort_by'),
+     Input('menu-items-table', 'filter_query'),
+     Input('filter-seq', 'data')]
 )
-def update_menu_items(selected_restaurants, selected_protein, selected_carbs, selected_fats, selected_calories, search_value):
+@metrics.instrumented('menu_items')
+def update_menu_items(selected_restaurants, selected_protein, selected_carbs, selected_fats, selected_calories, search_value, page_current, sort_by, filter_query, seq_token):
+    started = sequence_tracker.begin(seq_token)
     if selected_restaurants and selected_protein and selected_carbs and selected_fats and selected_calories:
-        filtered_menu_items = df[(df['restaurant'].isin(selected_restaurants)) &
-                                 (df['protein'] >= selected_protein[0]) & (df['protein'] <= selected_protein[1]) &
-                                 (df['carbohydrates'] >= selected_carbs[0]) & (df['carbohydrates'] <= selected_carbs[1]) &
-                                 (df['total_fat'] >= selected_fats[0]) & (df['total_fat'] <= selected_fats[1]) &
-                                 (df['calories'] >= selected_calories[0]) & (df['calories'] <= selected_calories[1])]
-
-        if search_value:
-            filtered_menu_items = filtered_menu_items[filtered_menu_items['item_name'].str.contains(search_value, case=False)]
-
-        if filtered_menu_items.empty:
-            return [html.Div(html.P("No menu items found for the selected criteria.", className='has-text-centered'), className='column is-full')]
-        else:
-            filtered_menu_items = filtered_menu_items.sort_values(by='calories')
-            grouped_menu_items = filtered_menu_items.groupby('restaurant')
-            restaurant_outputs = []
-
-            for restaurant, items in grouped_menu_items:
-                table = go.Figure(data=[go.Table(
-                    header=dict(values=['Item Name', 'Protein (g)', 'Carbs (g)', 'Fats (g)', 'Calories'],
-                                fill_color='#426B69',
-                                font=dict(color='white'),
-                                align='left'),
-                    cells=dict(values=[items['item_name'], items['protein'], items['carbohydrates'], items['total_fat'], items['calories']],
-                               fill_color='lavender',
-                               align='left'))
-                ])
-                table.update_layout(title=restaurant,
-                                    width=700,
-                                    height=500,
-                                    margin=dict(l=20, r=20, t=30, b=20),
-                                    hovermode='closest')
-                restaurant_outputs.append(html.Div(dcc.Graph(figure=table), className='column is-qu'))
-            return restaurant_outputs
+        dataset = dataset_manager.current
+        state = make_filter_state(selected_restaurants, selected_protein, selected_carbs, selected_fats, selected_calories, search_value)
+        with metrics.phase('filter'):
+            order = cached_table_order(dataset, state, sort_key(sort_by), filter_query or '')
+        metrics.record_rows(len(order))
+        sequence_tracker.check(seq_token, started)
+        if not len(order):
+            return [], 0, 0, html.P("No menu items found for the selected criteria.", className='has-text-centered')
+        if filters_triggered():
+            page_current = 0
+        with metrics.phase('build'):
+            records, page_count, page_current = page_records(dataset.df, order, page_current)
+        return records, page_count, page_current, html.P('{} menu items found.'.format(len(order)), className='has-text-centered')
     else:
-        return [html.Div(html.P("Please select at least one restaurant and one nutrient/caloric range.", className='has-text-centered'), className='column is-full')]
-#callback to update the scatter plot
-@app.callback(
+        return [], 0, 0, html.P("Please select at least one restaurant and one nutrient/caloric range.", className='has-text-centered')
+#callback to update the scatter plot; large selections are binned server-side and re-binned on zoom
+@server_callback(
     Output('scatter-plot', 'figure'),
     [Input('multiple-restaurant-dropdown', 'value'),
      Input('search-input', 'value'),
      Input('protein-range-slider', 'value'),
      Input('carbs-range-slider', 'value'),
      Input('fats-range-slider', 'value'),
-     Input('caloric-range-slider', 'value')]
+     Input('caloric-range-slider', 'value'),
+     Input('scatter-plot', 'relayoutData'),
+     Input('filter-seq', 'data')]
 )
-def update_scatter_plot(restaurants, search_input, protein_range, carbs_range, fats_range, caloric_range):
-    filtered_df = df[df['restaurant'].isin(restaurants)]
-    if search_input:
-        filtered_df = filtered_df[filtered_df['item_name'].str.contains(search_input, case=False)]
-    filtered_df = filtered_df[(filtered_df['protein'] >= protein_range[0]) & (filtered_df['protein'] <= protein_range[1])]
-    filtered_df = filtered_df[(filtered_df['carbohydrates'] >= carbs_range[0]) & (filtered_df['carbohydrates'] <= carbs_range[1])]
-    filtered_df = filtered_df[(filtered_df['total_fat'] >= fats_range[0]) & (filtered_df['total_fat'] <= fats_range[1])]
-    filtered_df = filtered_df[(filtered_df['calories'] >= caloric_range[0]) & (filtered_df['calories'] <= caloric_range[1])]
-    fig = px.scatter(filtered_df, x='protein', y='carbohydrates', color='calories', title = 'Protein vs. Carbohydrates')
-    fig.update_layout(
-        xaxis_title='Protein (g)',
-        yaxis_title='Carbs (g)',
-    )
-    return fig
+@metrics.instrumented('scatter')
+def update_scatter_plot(restaurants, search_input, protein_range, carbs_range, fats_range, caloric_range, relayout_data, seq_token):
+    started = sequence_tracker.begin(seq_token)
+    state = make_filter_state(restaurants, protein_range, carbs_range, fats_range, caloric_range, search_input)
+    view = view_from_relayout(relayout_data)
+    dataset = dataset_manager.current
+    checkpoint = lambda: sequence_tracker.check(seq_token, started)
+    return figure_cache.cached_figure('scatter', dataset.version, (state, view), lambda: build_scatter(dataset, state, view, checkpoint))
 
 #callback to update the pie chart
-@app.callback(
+@server_callback(
     Output('pie-chart', 'figure'),
     [Input('multiple-restaurant-dropdown', 'value'),
      Input('search-input', 'value'),
      Input('protein-range-slider', 'value'),
      Input('carbs-range-slider', 'value'),
      Input('fats-range-slider', 'value'),
-     Input('caloric-range-slider', 'value')]
+     Input('caloric-range-slider', 'value'),
+     Input('filter-seq', 'data')]
+)
+@metrics.instrumented('pie')
+def update_pie_chart(restaurants, search_input, protein_range, carbs_range, fats_range, caloric_range, seq_token):
+    started = sequence_tracker.begin(seq_token)
+    state = make_filter_state(restaurants, protein_range, carbs_range, fats_range, caloric_range, search_input)
+    dataset = dataset_manager.current
+    checkpoint = lambda: sequence_tracker.check(seq_token, started)
+    return figure_cache.cached_figure('pie', dataset.version, state, lambda: pie_figure(dataset, state, checkpoint))
+
+#warm-up of popular filter states in each worker and after every dataset swap (see warmer_from_env)
+def warm_rows(dataset, state):
+    #row set and default table order, which live in this worker's caches
+    cached_table_order(dataset, state, sort_key(None), '')
+
+def claim_warmup(version):
+    #with a shared figure backend one worker builds a version's figures for all of them
+    if figure_cache.backend is None or coalesce_cache is None:
+        return True
+    return coalesce_cache.add(('warmup', version), os.getpid(), expire=3600)
+
+warmer = warmer_from_env(
+    dataset_manager, figure_cache, make_filter_state,
+    #the browser draws these itself in client-side mode
+    {} if clientside_mode else warmup_figures,
+    warm_rows,
+    claim=claim_warmup,
+)
+if warmer is not None:
+    metrics.gauges.append(warmer.gauges)
+    dataset_manager.on_swap.append(warmer.on_swap)
+    #started from the first request of each worker, not at import: with gunicorn --preload the import
+    #happens in the master, whose caches the workers never see
+    server.before_request(warmer.ensure_started)
+
+#bumps the session's sequence number on every filter change, in the browser; the server callbacks take
+#filter-seq as an input, so they fire once the new number is set and older in-flight work can be dropped
+app.clientside_callback(
+    ClientsideFunction(namespace='menu', function_name='bump_sequence'),
+    Output('filter-seq', 'data'),
+    [Input('multiple-restaurant-dropdown', 'value'),
+     Input('search-input', 'value'),
+     Input('protein-range-slider', 'value'),
+     Input('carbs-range-slider', 'value'),
+     Input('fats-range-slider', 'value'),
+     Input('caloric-range-slider', 'value')],
+    State('filter-seq', 'data'),
 )
-def update_pie_chart(restaurants, search_input, protein_range, carbs_range, fats_range, caloric_range):
-    filtered_df = df[df['restaurant'].isin(restaurants)]
-    if search_input:
-        filtered_df = filtered_df[filtered_df['item_name'].str.contains(search_input, case=False)]
-    filtered_df = filtered_df[(filtered_df['protein'] >= protein_range[0]) & (filtered_df['protein'] <= protein_range[1])]
-    filtered_df = filtered_df[(filtered_df['carbohydrates'] >= carbs_range[0]) & (filtered_df['carbohydrates'] <= carbs_range[1])]
-    filtered_df = filtered_df[(filtered_df['total_fat'] >= fats_range[0]) & (filtered_df['total_fat'] <= fats_range[1])]
-    filtered_df = filtered_df[(filtered_df['calories'] >= caloric_range[0]) & (filtered_df['calories'] <= caloric_range[1])]
-    avg_protein = filtered_df['protein'].mean()
-    avg_carbs = filtered_df['carbohydrates'].mean()
-    avg_fat = filtered_df['total_fat'].mean()
-    nutrient_data = {
-        'Nutrient': ['Protein', 'Carbohydrates', 'Total Fat', 'Standard Protein', 'Standard Carbs', 'Standard Fat'],
-        'Value': [avg_protein, avg_carbs, avg_fat, standard_protein, standard_carbs, standard_fat]
-    }
-    fig = px.pie(nutrient_data, values='Value', names='Nutrient', title='Marco Composition for Selected Restaurants', hole=0.3)
-    fig.update_traces(textposition='outside', textinfo='percent+label')
-    fig.update_layout(
-        hovermode='closest'
+
+#client-side versions of the scatter and pie callbacks, reading the dataset the menu-data-store points at
+if clientside_mode:
+    #the compact dataset of one version never changes, so browsers may keep it for good
+    @server.route('/menu-data/<version>.json')
+    def menu_data(version):
+        dataset = dataset_manager.current
+        if version != dataset.version:
+            abort(404)
+        response = jsonify(encode_dataset(dataset))
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='menu', function_name='ready'),
+        [Output('menu-data-ready', 'data'), Output('menu-data-poll', 'disabled')],
+        [Input('menu-data-store', 'data'), Input('menu-data-poll', 'n_intervals')],
     )
-    return fig
+    client_inputs = [Input('multiple-restaurant-dropdown', 'value'),
+                     Input('search-input', 'value'),
+                     Input('protein-range-slider', 'value'),
+                     Input('carbs-range-slider', 'value'),
+                     Input('fats-range-slider', 'value'),
+                     Input('caloric-range-slider', 'value'),
+                     Input('menu-data-ready', 'data')]
+    app.clientside_callback(ClientsideFunction(namespace='menu', function_name='scatter'), Output('scatter-plot', 'figure'), client_inputs)
+    app.clientside_callback(ClientsideFunction(namespace='menu', function_name='pie'), Output('pie-chart', 'figure'), client_inputs,
+                            State('menu-data-store', 'data'))
     
 if __name__ == '__main__':
     app.run_server(debug=False)
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dash.exceptions import PreventUpdate
+
+#diskcache is optional: with it the sequence numbers are shared by every worker on the box; without it
+#each worker tracks the sessions it has seen itself
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+
+class SequenceTracker:
+    #drops callback work that a newer interaction has already superseded. Every filter change bumps a
+    #per-session sequence number in the browser (the filter-seq store); callbacks register the number
+    #they were fired with and call check() between phases, which aborts with PreventUpdate once the
+    #session has moved on, instead of finishing a figure nobody will see
+
+    def __init__(self, cache=None, ttl=3600, max_sessions=10000):
+        self.cache = cache
+        #sessions are forgotten after ttl seconds without a callback, and beyond max_sessions
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._latest = OrderedDict() #session -> (seq, last seen), least recently seen first
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.dropped_seconds = 0.0
+
+    def begin(self, token):
+        #records token's sequence number as the session's latest (if it is newer); returns the start time
+        if token:
+            session, seq = token['session'], token['seq']
+            if self.cache is not None:
+                with self.cache.transact():
+                    if seq > self.cache.get(('seq', session), -1):
+                        self.cache.set(('seq', session), seq, expire=self.ttl)
+            else:
+                now = time.time()
+                with self._lock:
+                    latest = self._latest.pop(session, (-1, now))[0]
+                    self._latest[session] = (max(seq, latest), now)
+                    while self._latest:
+                        oldest = next(iter(self._latest))
+                        if len(self._latest) <= self.max_sessions and now - self._latest[oldest][1] <= self.ttl:
+                            break
+                        del self._latest[oldest]
+        return time.perf_counter()
+
+    def latest(self, session):
+        if self.cache is not None:
+            return self.cache.get(('seq', session), -1)
+        with self._lock:
+            return self._latest.get(session, (-1, None))[0]
+
+    def check(self, token, started):
+        if token and self.latest(token['session']) > token['seq']:
+            with self._lock:
+                self.dropped += 1
+                self.dropped_seconds += time.perf_counter() - started
+            raise PreventUpdate
+
+    def gauges(self):
+        with self._lock:
+            return [
+                ('dashboard_stale_callbacks_dropped_total', 'Callbacks abandoned because a newer filter state arrived.', self.dropped),
+                ('dashboard_stale_callback_seconds_total', 'Worker seconds spent on callbacks before they were abandoned.', self.dropped_seconds),
+            ]
+
+
+def shared_cache(directory):
+    #the diskcache the sequence trackers of all workers share, or None
+    if diskcache is None:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return diskcache.Cache(directory)
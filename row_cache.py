@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+#memoization for the shared row sets: an LRU like functools.lru_cache, but bounded by the bytes of the
+#numpy arrays it holds instead of by entry count, since one full selection is megabytes at scale
+
+
+def bytes_lru_cache(max_bytes, key=None):
+    #key(*args) -> the cache key, when the arguments themselves should not be kept alive by the cache
+    def decorator(func):
+        entries = OrderedDict() #cache key -> array
+        lock = threading.Lock()
+        state = {'bytes': 0}
+
+        def remove(cache_key):
+            state['bytes'] -= entries.pop(cache_key).nbytes
+
+        @wraps(func)
+        def wrapper(*args):
+            cache_key = key(*args) if key else args
+            with lock:
+                if cache_key in entries:
+                    entries.move_to_end(cache_key)
+                    return entries[cache_key]
+            #computed outside the lock; two threads missing the same key both compute it, like lru_cache
+            result = func(*args)
+            if result.nbytes <= max_bytes:
+                with lock:
+                    if cache_key in entries:
+                        remove(cache_key)
+                    entries[cache_key] = result
+                    state['bytes'] += result.nbytes
+                    while state['bytes'] > max_bytes:
+                        remove(next(iter(entries)))
+            return result
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+                state['bytes'] = 0
+
+        def cache_bytes():
+            with lock:
+                return state['bytes']
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_bytes = cache_bytes
+        return wrapper
+    return decorator
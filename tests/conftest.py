@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_root)
+
+from menu_data import MenuData  # noqa: E402
+from menu_dataset import Dataset  # noqa: E402
+from menu_filters import make_filter_state, range_columns  # noqa: E402
+
+search_terms = ['chicken', 'Burger', 'ch', 'x', 'fries (', 'grilled chicken sand', 'zzzq']
+
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory):
+    #the dataset as production serves it: float32 columns memory-mapped from a snapshot of data.csv
+    snapshot_root = str(tmp_path_factory.mktemp('snapshot'))
+    return Dataset(MenuData.load(os.path.join(repo_root, 'data.csv'), snapshot_root))
+
+
+@pytest.fixture(scope='session')
+def random_states(dataset):
+    #random FilterStates: a few restaurants, each slider at its full range or narrowed to bounds that
+    #are either existing values (to hit the edges exactly) or arbitrary, optionally a search term
+    def generate(count, seed=0, search=True):
+        rng = np.random.default_rng(seed)
+        for _ in range(count):
+            restaurants = [str(name) for name in rng.choice(dataset.restaurants, size=rng.integers(1, 10), replace=False)]
+            ranges = []
+            for _, column in range_columns:
+                full = list(dataset.slider_bounds[column])
+                if rng.random() < 0.5:
+                    ranges.append(full)
+                elif rng.random() < 0.5:
+                    ranges.append(sorted(float(value) for value in rng.choice(dataset.df[column].to_numpy(), size=2)))
+                else:
+                    ranges.append(sorted(float(value) for value in rng.uniform(full[0] - 1, full[1] + 1, size=2)))
+            term = str(rng.choice(search_terms)) if search and rng.random() < 0.4 else None
+            yield make_filter_state(restaurants, *ranges, term)
+    return generate
+
+
+def pandas_mask(df, state):
+    #the boolean masks the callbacks filtered with before the indexes existed
+    mask = df['restaurant'].isin(state.restaurants)
+    for field, column in range_columns:
+        low, high = getattr(state, field)
+        mask &= (df[column] >= low) & (df[column] <= high)
+    if state.search:
+        mask &= df['item_name'].astype(object).str.contains(state.search, case=False, regex=False, na=False)
+    return mask.to_numpy()
+
+
+@pytest.fixture(scope='session')
+def baseline_mask():
+    return pandas_mask
@@ -0,0 +1,18 @@
+import numpy as np
+
+from menu_aggregates import macro_columns
+from menu_filters import macro_means
+
+
+def test_macro_means_match_masked_means(dataset, random_states, baseline_mask):
+    #covers both paths: cube totals (no search, at most one narrowed slider) and masked totals
+    for state in random_states(400, seed=2):
+        rows = dataset.df.loc[baseline_mask(dataset.df, state), macro_columns]
+        expected = rows.astype(np.float64).mean().to_numpy()
+        assert np.allclose(macro_means(dataset, state), expected, rtol=1e-5, equal_nan=True), state
+
+
+def test_cube_answers_restaurant_only_selections(dataset):
+    #full slider ranges are answered from the per-restaurant sums without touching the rows
+    ranges = [(column, dataset.slider_bounds[column]) for column in ['protein', 'carbohydrates', 'total_fat', 'calories']]
+    assert dataset.cube.totals(dataset.restaurants[:3], ranges) is not None
@@ -0,0 +1,14 @@
+import numpy as np
+
+from menu_filters import filtered_positions
+
+
+def test_filtered_positions_match_pandas_masks(dataset, random_states, baseline_mask):
+    for state in random_states(400):
+        expected = np.flatnonzero(baseline_mask(dataset.df, state))
+        assert np.array_equal(filtered_positions(dataset, state), expected), state
+
+
+def test_filtered_positions_are_read_only(dataset, random_states):
+    state = next(random_states(1, seed=1))
+    assert not filtered_positions(dataset, state).flags.writeable